@@ -0,0 +1,254 @@
+#####################################################################################################################
+# Description:
+# The backend_client.py module owns the shared HTTP clients used to talk to the MCM and MAGE backends.
+# One pooled httpx.AsyncClient is kept per backend host, so connections (and their TLS sessions) are reused
+# across chat turns instead of being re-established for every question.
+# Answers can also be streamed: BackendStream forwards text as the backend produces it (SSE or NDJSON) and
+# falls back to a single chunk for backends that only return a complete JSON body.
+# Every request goes through the endpoint's circuit breaker and, when enabled, is hedged (see resilience.py).
+#   Usage: (1) Import: from backend_client import post_question, BackendStream
+#          (2) Call by: response = await post_question(url, payload, timeout)
+#                       async for delta in BackendStream(url, payload, timeout): ...
+#####################################################################################################################
+import json
+from urllib.parse import urlsplit
+
+import httpx
+
+from constants import (
+    BACKEND_POOL_LIMITS,
+    DEFAULT_BACKEND_POOL_LIMITS,
+    MAGE_URL,
+    SKILL_NAME_TO_MCM_URL,
+    STREAM_BACKEND_RESPONSES,
+    USE_HTTP2,
+)
+from resilience import get_endpoint
+from tracing import child_span, propagation_headers
+
+# Backends that can stream pick one of these; everything else answers with a complete JSON body
+STREAM_HEADERS = {"Accept": "text/event-stream, application/x-ndjson, application/json"}
+
+# One client per backend host, created lazily inside the running event loop
+_clients = {}
+
+
+def _host(url):
+    return urlsplit(url).netloc
+
+
+def _http2_available():
+    # httpx only speaks HTTP/2 when the optional `h2` package is installed
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _pool_limits_by_host():
+    # Skill specific limits override the defaults; both MCM skills and MAGE are keyed by name
+    limits_by_host = {}
+    for skill_name, url in SKILL_NAME_TO_MCM_URL.items():
+        limits_by_host[_host(url)] = {
+            **DEFAULT_BACKEND_POOL_LIMITS,
+            **BACKEND_POOL_LIMITS.get(skill_name, {}),
+        }
+    limits_by_host[_host(MAGE_URL)] = {
+        **DEFAULT_BACKEND_POOL_LIMITS,
+        **BACKEND_POOL_LIMITS.get("MAGE", {}),
+    }
+    return limits_by_host
+
+
+POOL_LIMITS_BY_HOST = _pool_limits_by_host()
+
+
+def get_backend_client(url):
+    host = _host(url)
+    client = _clients.get(host)
+    if client is None or client.is_closed:
+        limits = POOL_LIMITS_BY_HOST.get(host, DEFAULT_BACKEND_POOL_LIMITS)
+        client = httpx.AsyncClient(
+            http2=USE_HTTP2 and _http2_available(),
+            limits=httpx.Limits(**limits),
+        )
+        _clients[host] = client
+    return client
+
+
+async def post_question(url, payload, timeout, mode="post"):
+    # mode="probe" sends a health probe: it counts towards the circuit breaker but not the hedging latency
+    client = get_backend_client(url)
+    with child_span("backend_request", url=url) as request_span:
+        headers = propagation_headers()
+        response = await get_endpoint(url).send(
+            lambda: client.post(url, json=payload, timeout=timeout, headers=headers),
+            mode=mode,
+        )
+        if request_span:
+            request_span.set_attribute("status_code", response.status_code)
+        return response
+
+
+async def open_question_stream(url, payload, timeout, headers=None):
+    # The returned response has only its headers read; the caller must aclose() it
+    client = get_backend_client(url)
+    with child_span("backend_request", url=url, stream=True) as request_span:
+        headers = {**(headers or {}), **propagation_headers()}
+        response = await get_endpoint(url).send(
+            lambda: client.send(
+                client.build_request(
+                    "POST", url, json=payload, timeout=timeout, headers=headers
+                ),
+                stream=True,
+            ),
+            mode="stream",
+        )
+        if request_span:
+            request_span.set_attribute("status_code", response.status_code)
+        return response
+
+
+async def close_backend_clients():
+    while _clients:
+        _, client = _clients.popitem()
+        await client.aclose()
+
+
+####################################################################################
+# Response Parsing
+####################################################################################
+
+
+def parse_response_json(full_response_json):
+    # Accepts a raw JSON string, an httpx/requests Response or an already parsed dict
+    if isinstance(full_response_json, dict):
+        return full_response_json
+    if isinstance(full_response_json, str) and full_response_json.strip():
+        try:
+            response_data = json.loads(full_response_json)
+        except json.JSONDecodeError:
+            print("Error: Received invalid JSON response")
+            return {}
+        return response_data if isinstance(response_data, dict) else {}
+    if hasattr(full_response_json, "json"):
+        try:
+            response_data = full_response_json.json()
+        except ValueError:
+            print("Error: Response object does not contain valid JSON")
+            return {}
+        return response_data if isinstance(response_data, dict) else {}
+    print("Error: full_response_json is empty or in an unexpected format")
+    return {}
+
+
+####################################################################################
+# Streaming Responses
+####################################################################################
+
+
+class BackendStream:
+    """Iterating yields text deltas as the backend sends them. Once exhausted, `text`
+    holds the whole answer and `response_json` the backend's final JSON payload;
+    `complete` is False when the backend answered with an error status or the stream
+    broke off, so a partial answer is not mistaken for a whole one (e.g. cached)."""
+
+    cache_hit = False
+    coalesced = False
+
+    def __init__(self, url, payload, timeout):
+        self.url = url
+        self.payload = payload
+        self.timeout = timeout
+        self.text = ""
+        self.response_json = {}
+        self.complete = False
+
+    async def __aiter__(self):
+        headers = STREAM_HEADERS if STREAM_BACKEND_RESPONSES else {}
+        try:
+            response = await open_question_stream(
+                self.url, self.payload, self.timeout, headers
+            )
+            try:
+                content_type = response.headers.get("content-type", "")
+                if "text/event-stream" in content_type:
+                    events = self._iter_sse_events(response)
+                elif "ndjson" in content_type:
+                    events = response.aiter_lines()
+                else:
+                    # Non-streaming backend: render the complete answer at once
+                    body = await response.aread()
+                    self.response_json = parse_response_json(body.decode("utf-8", "replace"))
+                    self.text = self.response_json.get("response", "") or ""
+                    self.complete = response.is_success
+                    if self.text:
+                        yield self.text
+                    return
+
+                async for data in events:
+                    delta = self._consume_event(data)
+                    if delta:
+                        self.text += delta
+                        yield delta
+                self.complete = response.is_success
+            finally:
+                await response.aclose()
+        except httpx.RequestError as e:
+            print(f"HTTP request failed: {e}")
+        except Exception as e:
+            print(f"An error occurred: {e}")
+
+        if not self.response_json:
+            self.response_json = {"response": self.text}
+
+    @staticmethod
+    async def _iter_sse_events(response):
+        # Joins multi-line `data:` fields; a blank line terminates each event
+        data_lines = []
+        async for line in response.aiter_lines():
+            if not line:
+                if data_lines:
+                    yield "\n".join(data_lines)
+                    data_lines = []
+            elif line.startswith("data:"):
+                data_lines.append(line[5:].removeprefix(" "))
+        if data_lines:
+            yield "\n".join(data_lines)
+
+    def _consume_event(self, data):
+        # An event is either plain text, {"delta"/"token": ...} or the final {"response": ...} payload
+        if not data.strip() or data.strip() == "[DONE]":
+            return ""
+        try:
+            event = json.loads(data)
+        except json.JSONDecodeError:
+            return data
+        if not isinstance(event, dict):
+            return data
+        if "delta" in event or "token" in event:
+            return event.get("delta") or event.get("token") or ""
+        if "response" in event:
+            self.response_json = event
+            full_text = event.get("response") or ""
+            # The final payload repeats the whole answer; only forward what has not been seen yet
+            if full_text.startswith(self.text):
+                return full_text[len(self.text) :]
+        return ""
+
+
+class FailedStream:
+    """Stands in for a BackendStream when the request is not sent at all (e.g. the backend is known
+    to be down): yields `text` once and is never complete, so it is not cached."""
+
+    cache_hit = False
+    coalesced = False
+    complete = False
+
+    def __init__(self, text):
+        self.text = text
+        self.response_json = {"response": text}
+
+    async def __aiter__(self):
+        yield self.text
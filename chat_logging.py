@@ -6,26 +6,64 @@
 #####################################################################################################################
 
 import csv
+import hashlib
+import itertools
 import os
 import tempfile
+import threading
 import time
+from collections import OrderedDict
 from datetime import datetime, timezone
 
 import boto3
-import gradio as gr
 
-# Access user data file
-from user_data import UserConfig
+from constants import (
+    CHAT_HISTORY_FLAGGED_INDEX,
+    CHAT_HISTORY_SESSION_INDEX,
+    CHAT_LOG_FLUSH_INTERVAL_SECS,
+    CHAT_LOG_QUEUE_SIZE,
+    CHAT_LOG_WRITE_BEHIND,
+    EVAL_QUESTIONS_CACHE_TTL_SECS,
+    FLAGGED_EXPORT_CACHE_SIZE,
+    FLAGGED_EXPORT_TTL_SECS,
+)
+from metrics import chat_reactions_total, time_dynamodb_call
+from tracing import traced
+from write_behind import WriteBehindQueue
 
 import json
 
-# Initialize DynamoDB
-dynamodb = boto3.resource("dynamodb", region_name="us-east-1")
-login_table = dynamodb.Table("UserLogin")
-chat_history_table = dynamodb.Table("ChatHistory")
-evaluation_questions_table = dynamodb.Table("EvalQuestions")
-evaluation_responses_table = dynamodb.Table("Evaluation")
-test_evaluation_responses_table = dynamodb.Table("TestEvaluation")
+LOGIN_TABLE = "UserLogin"
+CHAT_HISTORY_TABLE = "ChatHistory"
+EVALUATION_QUESTIONS_TABLE = "EvalQuestions"
+EVALUATION_RESPONSES_TABLE = "Evaluation"
+TEST_EVALUATION_RESPONSES_TABLE = "TestEvaluation"
+
+# DynamoDB handles are created on first use rather than at import: table name -> Table
+_dynamodb = None
+_tables = {}
+_dynamodb_lock = threading.Lock()
+
+
+def get_table(table_name):
+    global _dynamodb
+    with _dynamodb_lock:
+        if table_name not in _tables:
+            if _dynamodb is None:
+                _dynamodb = boto3.resource("dynamodb", region_name="us-east-1")
+            _tables[table_name] = _dynamodb.Table(table_name)
+        return _tables[table_name]
+
+
+# Background writer for ChatHistory, so chat turns do not wait on DynamoDB. Its client is
+# created by the worker thread on the first write.
+chat_history_writer = WriteBehindQueue(
+    lambda: boto3.client("dynamodb", region_name="us-east-1"),
+    CHAT_HISTORY_TABLE,
+    ("Username", "Timestamp"),
+    max_queue_size=CHAT_LOG_QUEUE_SIZE,
+    flush_interval=CHAT_LOG_FLUSH_INTERVAL_SECS,
+)
 
 
 ####################################################################################
@@ -40,7 +78,8 @@ def log_user_login(user_id, session_id):
         "SessionId": session_id,
         "Timestamp": timestamp,
     }
-    login_table.put_item(Item=login_data)
+    with time_dynamodb_call("log_user_login"):
+        get_table(LOGIN_TABLE).put_item(Item=login_data)
 
 
 ####################################################################################
@@ -48,7 +87,8 @@ def log_user_login(user_id, session_id):
 ####################################################################################
 
 
-def log_chat_history(user_id, session_id, question, response, reaction, backend, skill, full_response_json={}):
+@traced("log_chat_history")
+def log_chat_history(user_id, session_id, question, response, reaction, backend, skill, full_response_json={}, cache_hit=False, coalesced=False):
     timestamp = time.time()
     dt = datetime.fromtimestamp(timestamp)
     timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H-%M-%S")
@@ -61,8 +101,15 @@ def log_chat_history(user_id, session_id, question, response, reaction, backend,
         "Response": response,
         "Reaction": reaction,
         "Backend": backend,
-        "Skill": skill
+        "Skill": skill,
+        "CacheHit": cache_hit,
+        "Coalesced": coalesced,
     }
+    chat_reactions_total.inc(reaction=reaction, backend=backend, skill=skill)
+    # Only flagged items carry this attribute, which keeps the flagged GSI sparse
+    if reaction == "flagged":
+        chat_data["FlaggedSessionId"] = session_id
+        invalidate_flagged_export(user_id, session_id)
 
     # Handle serialization of full_response_json
     if isinstance(full_response_json, dict):
@@ -78,54 +125,38 @@ def log_chat_history(user_id, session_id, question, response, reaction, backend,
     else:
         chat_data["FullResponseJson"] = json.dumps({"error": "Non-serializable object"})
 
-    # Check if item exists and update or put item
-    existing_item = chat_history_table.get_item(
-        Key={
-            "Username": user_id,
-            "Timestamp": timestamp,
-        }
-    )
+    # Hand the item to the background writer; write inline if it is disabled or its queue is full
+    if CHAT_LOG_WRITE_BEHIND and chat_history_writer.submit(chat_data):
+        return
 
-    # Adding error handling
     try:
-        # Check if item exists and update or put item
-        existing_item = chat_history_table.get_item(
-            Key={
-                "Username": user_id,
-                "Timestamp": timestamp,
-            }
-        )
-
-        if "Item" in existing_item:
-            update_chat_history(user_id, session_id, question, response, reaction, full_response_json) 
-            print("Chat data updated successfully")
-        else:
-            chat_history_table.put_item(Item=chat_data)
-            chat_data["FullResponseJson"] = json.dumps(full_response_json)
-            print("Chat data logged successfully")
-
+        upsert_chat_history(chat_data)
+        print("Chat data logged successfully")
     except Exception as e:
         print(f"Error logging chat history: {e}")
 
 
-def update_chat_history(user_id, session_id, question, response, reaction, full_response_json):
-    timestamp = time.time()
-    dt = datetime.fromtimestamp(timestamp)
-    timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H-%M")
-
-    # Update item in DynamoDB
-    response = chat_history_table.update_item(
-        Key={
-            "Username": user_id,
-            "Timestamp": timestamp,
-        },
-        UpdateExpression="SET Reaction = :reaction, FullResponseJson = :full_response_json",
-        ExpressionAttributeValues={
-            ":reaction": reaction,
-            ":full_response_json": json.dumps(full_response_json)
-        },
-        ReturnValues="UPDATED_NEW",
-    )
+def upsert_chat_history(chat_data):
+    # One idempotent write keyed on (Username, Timestamp): creates the item or overwrites its attributes,
+    # so no read is needed to decide between put and update
+    attributes = {
+        name: value
+        for name, value in chat_data.items()
+        if name not in ("Username", "Timestamp")
+    }
+    with time_dynamodb_call("upsert_chat_history"):
+        get_table(CHAT_HISTORY_TABLE).update_item(
+            Key={
+                "Username": chat_data["Username"],
+                "Timestamp": chat_data["Timestamp"],
+            },
+            UpdateExpression="SET "
+            + ", ".join(f"#{name} = :{name}" for name in attributes),
+            ExpressionAttributeNames={f"#{name}": name for name in attributes},
+            ExpressionAttributeValues={
+                f":{name}": value for name, value in attributes.items()
+            },
+        )
 
 
 ####################################################################################
@@ -134,63 +165,84 @@ def update_chat_history(user_id, session_id, question, response, reaction, full_
 
 
 def log_commended_response(
-    history, backend, skill, user_id=UserConfig.USERNAME, session_id=UserConfig.ACCESS_TOKEN
+    history, backend, skill, user_id="-", session_id="-"
 ):
     if len(history) == 0:
-        return
+        return False
     response = history[-1][1]
     question = history[-1][0]
     log_chat_history(user_id, session_id, question, response, "liked", backend, skill)
-    gr.Info("Saved successfully!")
+    return True
 
 
 def log_disliked_response(
-    history, backend, skill, user_id=UserConfig.USERNAME, session_id=UserConfig.ACCESS_TOKEN
+    history, backend, skill, user_id="-", session_id="-"
 ):
     if len(history) == 0:
-        return
+        return False
     response = history[-1][1]
     question = history[-1][0]
     log_chat_history(user_id, session_id, question, response, "disliked", backend, skill)
-    gr.Info("Saved successfully!")
+    return True
 
 
 def log_flagged_response(
-    history, backend, skill, user_id=UserConfig.USERNAME, session_id=UserConfig.ACCESS_TOKEN
+    history, backend, skill, user_id="-", session_id="-"
 ):
     if len(history) == 0:
-        return
+        return False
     response = history[-1][1]
     question = history[-1][0]
     log_chat_history(user_id, session_id, question, response, "flagged", backend, skill)
-    gr.Info("Saved successfully!")
-
-
-def chat_liked_or_disliked(data: gr.LikeData, history, lti_data, session_settings):
-    question = history[data.index[0]][0]
-    response = history[data.index[0]][1]
-    if data.liked:
-        log_commended_response(
-            [[question, response]],
-            session_settings.value["backend"],
-            session_settings.value["skill"],
-            lti_data.value["user_id"],
-            lti_data.value["session_id"],
-        )
-    else:
-        log_disliked_response(
-            [[question, response]],
-            session_settings.value["backend"],
-            session_settings.value["skill"],
-            lti_data.value["user_id"],
-            lti_data.value["session_id"],
-        )
+    return True
+
+
+# Evaluation questions rarely change, so scans are cached per skill: skill_name -> (items, fetched_at)
+_evaluation_questions_cache = {}
+_evaluation_questions_lock = threading.Lock()
+
+
+def _scan_evaluation_questions(skill_name):
+    scan_kwargs = {
+        "FilterExpression": boto3.dynamodb.conditions.Attr("Skill").eq(skill_name)
+    }
+    items = []
+    while True:
+        with time_dynamodb_call("get_evaluation_questions"):
+            response = get_table(EVALUATION_QUESTIONS_TABLE).scan(**scan_kwargs)
+        items.extend(response.get("Items", []))
+        if "LastEvaluatedKey" not in response:
+            return items
+        scan_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
 
 
 def get_evaluation_questions(skill_name):
-    return evaluation_questions_table.scan(
-        FilterExpression=boto3.dynamodb.conditions.Attr("Skill").eq(skill_name)
-    )
+    with _evaluation_questions_lock:
+        cached = _evaluation_questions_cache.get(skill_name)
+    if cached and time.time() - cached[1] < EVAL_QUESTIONS_CACHE_TTL_SECS:
+        return {"Items": list(cached[0])}
+
+    items = _scan_evaluation_questions(skill_name)
+    with _evaluation_questions_lock:
+        _evaluation_questions_cache[skill_name] = (items, time.time())
+    return {"Items": list(items)}
+
+
+def invalidate_evaluation_questions(skill_name=None):
+    # Drops one skill, or every skill when no name is given
+    with _evaluation_questions_lock:
+        if skill_name is None:
+            _evaluation_questions_cache.clear()
+        else:
+            _evaluation_questions_cache.pop(skill_name, None)
+
+
+def warm_evaluation_questions_cache(skill_names):
+    for skill_name in skill_names:
+        try:
+            get_evaluation_questions(skill_name)
+        except Exception as e:
+            print(f"Error warming evaluation questions for {skill_name}: {e}")
 
 
 def log_evaluation_response(
@@ -201,14 +253,16 @@ def log_evaluation_response(
     eval_ratings,
     use_test_eval_db,
     backend,
+    user_id="-",
+    session_id="-",
 ):
     timestamp = time.time()
     dt = datetime.fromtimestamp(timestamp)
     timestamp = dt.strftime("%b-%d-%Y_%H:%M")
     eval_response_data = {
         "Timestamp": timestamp,
-        "Username": UserConfig.USERNAME,
-        "SessionId": UserConfig.ACCESS_TOKEN,
+        "Username": user_id,
+        "SessionId": session_id,
         "Skill": mcm_skill,
         "Question": question,
         "QuestionType": question_type,
@@ -220,11 +274,12 @@ def log_evaluation_response(
         "Metric_Compactness": eval_ratings[4],
         "Backend": backend,
     }
+    table = get_table(
+        TEST_EVALUATION_RESPONSES_TABLE if use_test_eval_db else EVALUATION_RESPONSES_TABLE
+    )
     try:
-        if use_test_eval_db:
-            test_evaluation_responses_table.put_item(Item=eval_response_data)
-        else:
-            evaluation_responses_table.put_item(Item=eval_response_data)
+        with time_dynamodb_call("log_evaluation_response"):
+            table.put_item(Item=eval_response_data)
     except Exception as e:
         print(f"Error logging evaluation response: {str(e)}")
 
@@ -234,13 +289,40 @@ def log_evaluation_response(
 ####################################################################################
 
 
+def iter_flagged_messages(user_id, session_id):
+    # Queries the session's items through a GSI instead of scanning the table, following
+    # LastEvaluatedKey so results are complete and yielded one page at a time
+    filter_expression = boto3.dynamodb.conditions.Attr("Username").eq(
+        user_id
+    ) & boto3.dynamodb.conditions.Attr("Reaction").eq("flagged")
+    if CHAT_HISTORY_FLAGGED_INDEX:
+        # Sparse index over FlaggedSessionId; Reaction is still checked in case it changed later
+        query_kwargs = {
+            "IndexName": CHAT_HISTORY_FLAGGED_INDEX,
+            "KeyConditionExpression": boto3.dynamodb.conditions.Key(
+                "FlaggedSessionId"
+            ).eq(session_id),
+        }
+    else:
+        query_kwargs = {
+            "IndexName": CHAT_HISTORY_SESSION_INDEX,
+            "KeyConditionExpression": boto3.dynamodb.conditions.Key("SessionId").eq(
+                session_id
+            ),
+        }
+    query_kwargs["FilterExpression"] = filter_expression
+
+    while True:
+        with time_dynamodb_call("iter_flagged_messages"):
+            response = get_table(CHAT_HISTORY_TABLE).query(**query_kwargs)
+        yield from response.get("Items", [])
+        if "LastEvaluatedKey" not in response:
+            return
+        query_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
 def fetch_flagged_messages(user_id, session_id):
-    response = chat_history_table.scan(
-        FilterExpression=boto3.dynamodb.conditions.Attr("Username").eq(user_id)
-        & boto3.dynamodb.conditions.Attr("SessionId").eq(session_id)
-        & boto3.dynamodb.conditions.Attr("Reaction").eq("flagged")
-    )
-    return response.get("Items", [])
+    return list(iter_flagged_messages(user_id, session_id))
 
 
 ####################################################################################
@@ -248,16 +330,86 @@ def fetch_flagged_messages(user_id, session_id):
 ####################################################################################
 
 
+# Recently generated exports, keyed by (user_id, session_id) -> (filepath, created_at)
+FLAGGED_EXPORT_DIR = os.path.join(tempfile.gettempdir(), "ivy_flagged_exports")
+_flagged_exports = OrderedDict()
+_flagged_exports_lock = threading.Lock()
+
+
+def _remove_export_file(filepath):
+    try:
+        os.remove(filepath)
+    except OSError:
+        pass
+
+
+def _evict_flagged_exports():
+    # Caller holds _flagged_exports_lock
+    now = time.time()
+    for key, (filepath, created_at) in list(_flagged_exports.items()):
+        if now - created_at > FLAGGED_EXPORT_TTL_SECS:
+            del _flagged_exports[key]
+            _remove_export_file(filepath)
+    while len(_flagged_exports) > FLAGGED_EXPORT_CACHE_SIZE:
+        _, (filepath, _) = _flagged_exports.popitem(last=False)
+        _remove_export_file(filepath)
+
+    # Artifacts left behind by earlier processes are not tracked; expire them by age
+    cached_paths = {filepath for filepath, _ in _flagged_exports.values()}
+    for entry in os.scandir(FLAGGED_EXPORT_DIR):
+        if entry.path not in cached_paths and now - entry.stat().st_mtime > FLAGGED_EXPORT_TTL_SECS:
+            _remove_export_file(entry.path)
+
+
+def invalidate_flagged_export(user_id, session_id):
+    with _flagged_exports_lock:
+        cached = _flagged_exports.pop((user_id, session_id), None)
+    if cached:
+        _remove_export_file(cached[0])
+
+
+def get_cached_flagged_export(user_id, session_id):
+    with _flagged_exports_lock:
+        cached = _flagged_exports.get((user_id, session_id))
+        if cached is None:
+            return None
+        filepath, created_at = cached
+        if time.time() - created_at > FLAGGED_EXPORT_TTL_SECS or not os.path.exists(
+            filepath
+        ):
+            del _flagged_exports[(user_id, session_id)]
+            _remove_export_file(filepath)
+            return None
+        _flagged_exports.move_to_end((user_id, session_id))
+        return filepath
+
+
 def generate_csv(user_id, session_id):
-    items = fetch_flagged_messages(user_id, session_id)
-    if not items:
+    # Repeat clicks within the TTL reuse the file that was already generated
+    filepath = get_cached_flagged_export(user_id, session_id)
+    if filepath:
+        return filepath
+
+    # Make sure flags still sitting in the write-behind queue are included
+    chat_history_writer.flush(timeout=CHAT_LOG_FLUSH_INTERVAL_SECS * 5)
+
+    items = iter_flagged_messages(user_id, session_id)
+    first_item = next(items, None)
+    if first_item is None:
         return None
 
     timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H-%M")
-    temp_dir = tempfile.gettempdir()
-    filepath = os.path.join(temp_dir, f"{user_id}_{timestamp}_flagged.csv")
+    os.makedirs(FLAGGED_EXPORT_DIR, exist_ok=True)
+    # One file per cached (user, session): the session id is hashed, since on the main page it is the
+    # access token and the file name is visible in the download
+    session_hash = hashlib.sha256(str(session_id).encode()).hexdigest()[:12]
+    filepath = os.path.join(
+        FLAGGED_EXPORT_DIR, f"{user_id}_{session_hash}_{timestamp}_flagged.csv"
+    )
 
-    with open(filepath, mode="w", newline="") as file:
+    # Rows are written as pages arrive; the file is renamed into place once complete
+    partial_filepath = f"{filepath}.{threading.get_ident()}.partial"
+    with open(partial_filepath, mode="w", newline="") as file:
         writer = csv.writer(file)
         writer.writerow(
             [
@@ -268,7 +420,7 @@ def generate_csv(user_id, session_id):
                 "Reaction",
             ]
         )
-        for item in items:
+        for item in itertools.chain([first_item], items):
             writer.writerow(
                 [
                     item["Username"],
@@ -278,5 +430,11 @@ def generate_csv(user_id, session_id):
                     item["Reaction"],
                 ]
             )
+    os.replace(partial_filepath, filepath)
+
+    with _flagged_exports_lock:
+        _flagged_exports[(user_id, session_id)] = (filepath, time.time())
+        _flagged_exports.move_to_end((user_id, session_id))
+        _evict_flagged_exports()
 
     return filepath
@@ -0,0 +1,77 @@
+#####################################################################################################################
+# Description:
+# The chat_rendering.py module controls how streamed answers are pushed to the Gradio chatbot.
+# Every yield from a chat handler makes Gradio postprocess and diff the whole conversation, so streamed text is
+# coalesced into frames (at most CHAT_RENDER_FPS per second) and the conversation is capped to the most recent turns.
+# Gradio sends consecutive yields of the same history as "append" diffs, so each frame only carries the new text.
+#   Usage: (1) Import: from chat_rendering import throttled_render, trim_history
+#          (2) Call by: async for history in throttled_render(history, deltas): yield history
+#####################################################################################################################
+import asyncio
+import time
+
+from constants import CHAT_RENDER_FPS, MAX_CHAT_HISTORY_TURNS
+
+# Marks the end of the delta stream in the render queue
+_END_OF_STREAM = object()
+
+
+def trim_history(history, max_turns=MAX_CHAT_HISTORY_TURNS):
+    # Older turns are dropped from the chatbot so each update re-serializes a bounded conversation
+    if max_turns and len(history) > max_turns:
+        return history[-max_turns:]
+    return history
+
+
+async def _pump_deltas(deltas, queue):
+    # Drains the source in a single task so streaming contexts are entered and exited in the same task
+    try:
+        async for delta in deltas:
+            queue.put_nowait(delta)
+    finally:
+        queue.put_nowait(_END_OF_STREAM)
+
+
+async def throttled_render(history, deltas, fps=CHAT_RENDER_FPS):
+    """Appends each delta to the last chatbot message and yields `history` at most `fps` times
+    per second. Text that arrives between frames is coalesced; the final state is always yielded."""
+    min_interval = 1.0 / fps if fps > 0 else 0.0
+    queue = asyncio.Queue()
+    producer = asyncio.create_task(_pump_deltas(deltas, queue))
+    last_render = 0.0
+    dirty = False
+    finished = False
+    try:
+        while not finished:
+            timeout = None
+            if dirty:
+                timeout = max(0.0, last_render + min_interval - time.monotonic())
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                # Frame deadline reached while text is still pending
+                last_render, dirty = time.monotonic(), False
+                yield history
+                continue
+
+            # Coalesce everything that is already waiting into one frame
+            while True:
+                if item is _END_OF_STREAM:
+                    finished = True
+                    break
+                history[-1][1] += item
+                dirty = True
+                if queue.empty():
+                    break
+                item = queue.get_nowait()
+
+            if dirty and (finished or time.monotonic() - last_render >= min_interval):
+                last_render, dirty = time.monotonic(), False
+                yield history
+        if not last_render:
+            # Empty answer: still emit one frame so the handler has an output
+            yield history
+        # Surface errors raised by the delta source
+        await producer
+    finally:
+        producer.cancel()
@@ -0,0 +1,153 @@
+#####################################################################################################################
+# Description:
+# The concurrency.py module limits how many backend requests run at once, per skill and per backend.
+# Each limit is a FairSemaphore: waiters are served round-robin by group (courses for a skill, skills for a backend)
+# so one busy course or slow skill cannot monopolise the slots, and the wait line is bounded so that requests
+# are rejected immediately (BackendBusyError) instead of queueing behind an overloaded backend.
+#   Usage: (1) Import: from concurrency import concurrency_limiter
+#          (2) Call by: async with concurrency_limiter.slot(backend, skill, course): ...
+#                       async for delta in concurrency_limiter.limit_stream(stream, backend, skill, course): ...
+#####################################################################################################################
+import asyncio
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+
+from constants import (
+    BACKEND_CONCURRENCY_LIMITS,
+    DEFAULT_BACKEND_CONCURRENCY_LIMIT,
+    DEFAULT_SKILL_CONCURRENCY_LIMIT,
+    MAX_WAITING_PER_LIMIT,
+    SKILL_CONCURRENCY_LIMITS,
+)
+
+
+class BackendBusyError(Exception):
+    pass
+
+
+class FairSemaphore:
+    def __init__(self, name, limit, max_waiting=MAX_WAITING_PER_LIMIT):
+        self.name = name
+        self.limit = limit
+        self.max_waiting = max_waiting
+        self.in_use = 0
+        self.waiting = 0
+        # group -> deque of waiter futures; group order is the round-robin order
+        self._waiters = OrderedDict()
+
+    async def acquire(self, group=""):
+        if self.in_use < self.limit and not self.waiting:
+            self.in_use += 1
+            return
+        if self.waiting >= self.max_waiting:
+            raise BackendBusyError(f"{self.name} is at capacity")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(group, deque()).append(waiter)
+        self.waiting += 1
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just before the cancellation; pass it on
+                self.release()
+            else:
+                self._waiters[group].remove(waiter)
+                if not self._waiters[group]:
+                    del self._waiters[group]
+                self.waiting -= 1
+            raise
+
+    def release(self):
+        if self._waiters:
+            # Hand the slot straight to the next group in round-robin order
+            group, group_waiters = next(iter(self._waiters.items()))
+            waiter = group_waiters.popleft()
+            if group_waiters:
+                self._waiters.move_to_end(group)
+            else:
+                del self._waiters[group]
+            self.waiting -= 1
+            waiter.set_result(None)
+        else:
+            self.in_use -= 1
+
+
+class ConcurrencyLimiter:
+    def __init__(self):
+        self._skill_limits = {}
+        self._backend_limits = {}
+
+    def _skill_semaphore(self, skill):
+        if skill not in self._skill_limits:
+            self._skill_limits[skill] = FairSemaphore(
+                skill, SKILL_CONCURRENCY_LIMITS.get(skill, DEFAULT_SKILL_CONCURRENCY_LIMIT)
+            )
+        return self._skill_limits[skill]
+
+    def _backend_semaphore(self, backend):
+        if backend not in self._backend_limits:
+            self._backend_limits[backend] = FairSemaphore(
+                backend,
+                BACKEND_CONCURRENCY_LIMITS.get(backend, DEFAULT_BACKEND_CONCURRENCY_LIMIT),
+            )
+        return self._backend_limits[backend]
+
+    @asynccontextmanager
+    async def slot(self, backend, skill, course=""):
+        # Skill first, so a request never holds a backend slot while waiting for its skill
+        skill_semaphore = self._skill_semaphore(skill)
+        backend_semaphore = self._backend_semaphore(backend)
+        await skill_semaphore.acquire(course)
+        try:
+            await backend_semaphore.acquire(skill)
+            try:
+                yield
+            finally:
+                backend_semaphore.release()
+        finally:
+            skill_semaphore.release()
+
+    def limit_stream(self, stream, backend, skill, course=""):
+        return LimitedStream(self, stream, backend, skill, course)
+
+    def stats(self):
+        return {
+            "skills": {
+                name: {"in_use": sem.in_use, "waiting": sem.waiting}
+                for name, sem in self._skill_limits.items()
+            },
+            "backends": {
+                name: {"in_use": sem.in_use, "waiting": sem.waiting}
+                for name, sem in self._backend_limits.items()
+            },
+        }
+
+
+class LimitedStream:
+    """Runs a backend_client.BackendStream only while holding its skill and backend slots."""
+
+    def __init__(self, limiter, stream, backend, skill, course):
+        self._limiter = limiter
+        self._stream = stream
+        self._slot_args = (backend, skill, course)
+
+    @property
+    def text(self):
+        return self._stream.text
+
+    @property
+    def response_json(self):
+        return self._stream.response_json
+
+    @property
+    def complete(self):
+        return self._stream.complete
+
+    async def __aiter__(self):
+        async with self._limiter.slot(*self._slot_args):
+            async for delta in self._stream:
+                yield delta
+
+
+concurrency_limiter = ConcurrencyLimiter()
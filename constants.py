@@ -29,6 +29,114 @@ SKILL_NAME_TO_MCM_URL = {
     "Resolution Theorem Proving": "https://rtp.dilab-ivy.com/ivy/ask_question",
     "Logic": "https://logic.dilab-ivy.com/ivy/ask_question",
 }
+MAGE_URL = "https://mage.dilab-ivy.com/ivy/ask_question"
+
+# Connection pool settings for the shared backend HTTP clients (see backend_client.py).
+# Each backend host gets its own pool; entries are keyed by skill name (or "MAGE") and override the defaults.
+DEFAULT_BACKEND_POOL_LIMITS = {
+    "max_connections": 20,
+    "max_keepalive_connections": 10,
+    "keepalive_expiry": 30,
+}
+BACKEND_POOL_LIMITS = {
+    "MAGE": {"max_connections": 40, "max_keepalive_connections": 20},
+}
+USE_HTTP2 = os.getenv("IVY_HTTP2", "false").lower() == "true"
+# Ask backends for a streamed (SSE/NDJSON) answer; backends without streaming support still answer with JSON
+STREAM_BACKEND_RESPONSES = os.getenv("IVY_STREAM_RESPONSES", "true").lower() == "true"
+
+# Chatbot rendering (see chat_rendering.py): streamed text is pushed at most this many frames per second,
+# and only the most recent turns are kept in the conversation (0 disables either limit)
+CHAT_RENDER_FPS = int(os.getenv("IVY_RENDER_FPS", "20"))
+MAX_CHAT_HISTORY_TURNS = int(os.getenv("IVY_MAX_HISTORY_TURNS", "50"))
+
+# ChatHistory write-behind (see write_behind.py): logged turns are queued and written in batches
+CHAT_LOG_WRITE_BEHIND = os.getenv("IVY_CHAT_LOG_WRITE_BEHIND", "true").lower() == "true"
+CHAT_LOG_QUEUE_SIZE = int(os.getenv("IVY_CHAT_LOG_QUEUE_SIZE", "1000"))
+CHAT_LOG_FLUSH_INTERVAL_SECS = float(os.getenv("IVY_CHAT_LOG_FLUSH_INTERVAL", "1.0"))
+
+# ChatHistory GSIs used for lookups. The flagged index is optional: a sparse GSI keyed on FlaggedSessionId
+# (only set on flagged items) that projects Question, Response and Reaction; SessionIndex is used without it.
+CHAT_HISTORY_SESSION_INDEX = "SessionIndex"
+CHAT_HISTORY_FLAGGED_INDEX = os.getenv("IVY_CHAT_HISTORY_FLAGGED_INDEX", "")
+
+# Generated "Download Flagged Responses" files are reused for repeat clicks within the TTL and deleted afterwards
+FLAGGED_EXPORT_CACHE_SIZE = 32
+FLAGGED_EXPORT_TTL_SECS = 300
+
+# Evaluation questions are cached per skill for this long (and pre-warmed at startup)
+EVAL_QUESTIONS_CACHE_TTL_SECS = int(os.getenv("IVY_EVAL_QUESTIONS_TTL", "900"))
+
+# Deployment: number of uvicorn worker processes and where per-session data is kept (see session_store.py).
+# Several workers need a shared store, so the default switches to SQLite when IVY_WORKERS > 1.
+UVICORN_WORKERS = int(os.getenv("IVY_WORKERS", "1"))
+SESSION_STORE_URL = os.getenv(
+    "IVY_SESSION_STORE",
+    "memory://" if UVICORN_WORKERS == 1 else "sqlite:///ivy_sessions.sqlite3",
+)
+SESSION_TTL_SECS = int(os.getenv("IVY_SESSION_TTL", str(12 * 60 * 60)))
+# A Cognito code exchange is reused only for reloads of the redirect page within this window, so a leaked
+# ?code= URL can't be replayed later to sign in
+CODE_EXCHANGE_TTL_SECS = int(os.getenv("IVY_CODE_EXCHANGE_TTL", "30"))
+
+# Request scheduling (see concurrency.py). Backend calls are limited per skill and per backend; once
+# MAX_WAITING_PER_LIMIT requests are waiting for a limit, new ones are rejected right away.
+DEFAULT_SKILL_CONCURRENCY_LIMIT = 8
+SKILL_CONCURRENCY_LIMITS = {
+    "Resolution Theorem Proving": 4,
+}
+DEFAULT_BACKEND_CONCURRENCY_LIMIT = 32
+BACKEND_CONCURRENCY_LIMITS = {
+    "MCM": 64,
+    "MAGE": 16,
+}
+MAX_WAITING_PER_LIMIT = 32
+# Gradio queues: handlers are async, so many events can run at once; the queue itself is bounded
+GRADIO_CONCURRENCY_LIMIT = 64
+GRADIO_QUEUE_MAX_SIZE = 256
+BACKEND_BUSY_MESSAGE = "Ivy is busy answering other questions right now. Please try again in a moment."
+
+# Backend resilience (see resilience.py). After CIRCUIT_FAILURE_THRESHOLD consecutive timeouts or errors an
+# endpoint fails fast for CIRCUIT_RECOVERY_SECS, then lets a single probe request through. With hedging on,
+# a second attempt is sent once a request has taken longer than the endpoint's observed HEDGE_PERCENTILE latency.
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("IVY_CIRCUIT_FAILURES", "5"))
+CIRCUIT_RECOVERY_SECS = float(os.getenv("IVY_CIRCUIT_RECOVERY", "30"))
+HEDGE_REQUESTS = os.getenv("IVY_HEDGE_REQUESTS", "false").lower() == "true"
+HEDGE_PERCENTILE = 0.95
+HEDGE_MIN_DELAY_SECS = 0.5
+HEDGE_MIN_SAMPLES = 20
+LATENCY_WINDOW_SIZE = 200
+
+# Backend health probing (see health.py). Every PROBE_INTERVAL_SECS each MCM skill URL and MAGE is sent
+# PROBE_QUESTION, which keeps idle containers warm; 0 disables the prober. Answers slower than
+# PROBE_DEGRADED_SECS mark the backend as degraded.
+PROBE_INTERVAL_SECS = float(os.getenv("IVY_PROBE_INTERVAL", "60"))
+PROBE_TIMEOUT_SECS = float(os.getenv("IVY_PROBE_TIMEOUT", "30"))
+PROBE_DEGRADED_SECS = float(os.getenv("IVY_PROBE_DEGRADED", "10"))
+PROBE_QUESTION = "Hello"
+PROBE_API_KEY = "123456789"
+
+# Tracing (see tracing.py). Spans are written as OTLP/JSON to IVY_TRACE_FILE and/or posted to the OTLP/HTTP
+# collector at IVY_OTLP_ENDPOINT (e.g. http://localhost:4318); with neither set nothing is exported.
+TRACE_FILE = os.getenv("IVY_TRACE_FILE", "")
+OTLP_ENDPOINT = os.getenv("IVY_OTLP_ENDPOINT", "")
+TRACE_SERVICE_NAME = "ivy-chatbot"
+TRACE_EXPORT_INTERVAL_SECS = 2.0
+TRACE_QUEUE_SIZE = 10000
+# Sent with every backend request; holds the chat session's trace ID
+CORRELATION_ID_HEADER = "X-Correlation-ID"
+DEFAULT_SKILL = "Classification"
+
+# Backend answer cache (see response_cache.py). Skills listed in IVY_RESPONSE_CACHE_DISABLED_SKILLS
+# (comma separated) always go to the backend.
+RESPONSE_CACHE_ENABLED = os.getenv("IVY_RESPONSE_CACHE", "true").lower() == "true"
+RESPONSE_CACHE_TTL_SECS = int(os.getenv("IVY_RESPONSE_CACHE_TTL", "3600"))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("IVY_RESPONSE_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+RESPONSE_CACHE_DISABLED_SKILLS = {
+    skill.strip()
+    for skill in os.getenv("IVY_RESPONSE_CACHE_DISABLED_SKILLS", "").split(",")
+    if skill.strip()
+}
 COGNITO_DOMAIN = "https://ivy.auth.us-east-1.amazoncognito.com"
 REDIRECT_URL = (
     "http://localhost:8002/ask-ivy"
@@ -0,0 +1,153 @@
+#####################################################################################################################
+# Description:
+# The health.py module runs a background prober next to the FastAPI app. Every PROBE_INTERVAL_SECS it sends a
+# short question to each MCM skill URL and to MAGE, which keeps idle backend containers warm so the first real
+# question after a quiet period does not time out, and records each backend's health and rolling latency.
+# The state is served by /healthz (per-skill status) and /readyz (503 until at least one backend answers), and
+# questions to a backend that is down fail fast instead of waiting for their timeout (see is_available).
+#   Usage: (1) Import: from health import backend_prober
+#          (2) Call by: app.router.add_event_handler("startup", backend_prober.start)
+#                       backend_prober.skill_status()
+#####################################################################################################################
+import asyncio
+import time
+
+from backend_client import post_question
+from constants import (
+    DEFAULT_SKILL,
+    MAGE_URL,
+    PROBE_API_KEY,
+    PROBE_DEGRADED_SECS,
+    PROBE_INTERVAL_SECS,
+    PROBE_QUESTION,
+    PROBE_TIMEOUT_SECS,
+    SKILL_NAME_TO_MCM_URL,
+)
+from resilience import LatencyTracker
+
+
+class BackendHealth:
+    def __init__(self, url):
+        self.url = url
+        self.status = "unknown"
+        self.consecutive_failures = 0
+        self.last_checked = None
+        self.last_latency_secs = None
+        self.last_error = ""
+        self.latency = LatencyTracker(window_size=30, min_samples=1)
+
+    def record(self, latency_secs, error=""):
+        self.last_checked = time.time()
+        self.last_error = error
+        if error:
+            self.consecutive_failures += 1
+            # One missed probe may be a blip; two in a row means the backend is down
+            self.status = "down" if self.consecutive_failures > 1 else "degraded"
+            return
+        self.consecutive_failures = 0
+        self.last_latency_secs = latency_secs
+        self.latency.record(latency_secs)
+        self.status = "degraded" if latency_secs > PROBE_DEGRADED_SECS else "ok"
+
+    def to_dict(self):
+        return {
+            "status": self.status,
+            "last_checked": self.last_checked,
+            "last_latency_secs": self.last_latency_secs,
+            "p50_latency_secs": self.latency.percentile(0.5),
+            "p95_latency_secs": self.latency.percentile(0.95),
+            "consecutive_failures": self.consecutive_failures,
+            "last_error": self.last_error,
+        }
+
+
+class BackendProber:
+    def __init__(self, interval=PROBE_INTERVAL_SECS, timeout=PROBE_TIMEOUT_SECS):
+        self.interval = interval
+        self.timeout = timeout
+        self.rounds = 0
+        self._task = None
+        # Probe targets are named like the UI's backend/skill choices: "MCM:<skill>" and "MAGE"
+        mcm_payload = {"question": PROBE_QUESTION, "api_key": PROBE_API_KEY, "Episodic_Knowledge": {}}
+        self._targets = {
+            f"MCM:{skill_name}": (url, mcm_payload) for skill_name, url in SKILL_NAME_TO_MCM_URL.items()
+        }
+        self._targets["MAGE"] = (
+            MAGE_URL,
+            {"question": PROBE_QUESTION, "api_key": PROBE_API_KEY, "skill": DEFAULT_SKILL},
+        )
+        self.health = {name: BackendHealth(url) for name, (url, _) in self._targets.items()}
+
+    async def probe(self, name):
+        url, payload = self._targets[name]
+        started = time.monotonic()
+        try:
+            response = await post_question(url, payload, self.timeout, mode="probe")
+            error = f"HTTP {response.status_code}" if response.status_code >= 500 else ""
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        self.health[name].record(time.monotonic() - started, error)
+
+    async def probe_all(self):
+        await asyncio.gather(*(self.probe(name) for name in self._targets))
+        self.rounds += 1
+
+    async def _run(self):
+        while True:
+            try:
+                await self.probe_all()
+            except Exception as e:
+                print(f"Error probing backends: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def start(self):
+        if self.interval <= 0 or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def backend_health(self, backend, skill):
+        return self.health.get("MAGE" if backend == "MAGE" else f"MCM:{skill}")
+
+    def is_available(self, backend, skill):
+        # Unknown (not probed yet, or probing disabled) counts as available
+        health = self.backend_health(backend, skill)
+        return health is None or health.status != "down"
+
+    def skill_status(self):
+        return {
+            skill_name: {
+                backend: self.backend_health(backend, skill_name).status for backend in ("MCM", "MAGE")
+            }
+            for skill_name in SKILL_NAME_TO_MCM_URL
+        }
+
+    def is_ready(self):
+        # Ready once a probe round has finished and at least one backend answered its last probe ("degraded"
+        # also covers a first failed probe, so status alone can't tell); disabled probing is always ready
+        if self.interval <= 0:
+            return True
+        return self.rounds > 0 and any(
+            health.last_checked is not None and health.consecutive_failures == 0
+            for health in self.health.values()
+        )
+
+    def report(self):
+        return {
+            "ready": self.is_ready(),
+            "probe_rounds": self.rounds,
+            "skills": self.skill_status(),
+            "backends": {name: health.to_dict() for name, health in self.health.items()},
+        }
+
+
+backend_prober = BackendProber()
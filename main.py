@@ -2,9 +2,12 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+import asyncio
 import base64
+import functools
 import random
 import sys
+import threading
 import time
 from datetime import datetime, timezone
 
@@ -13,49 +16,109 @@ import httpx
 import requests
 import uvicorn
 from fastapi import FastAPI
-from starlette.responses import RedirectResponse
-import json
-
+from starlette.responses import JSONResponse, RedirectResponse, Response
+
+from backend_client import (
+    BackendStream,
+    FailedStream,
+    close_backend_clients,
+    parse_response_json,
+    post_question,
+)
 from chat_logging import *
+from chat_rendering import throttled_render, trim_history
+from concurrency import BackendBusyError, concurrency_limiter
+from health import backend_prober
+from metrics import CONTENT_TYPE, observe_embed_response, registry, streamed_bytes_total
+from resilience import endpoint_stats
+from response_cache import CachedStream, response_cache
+from single_flight import get_flight_key, single_flight
 from constants import (
+    BACKEND_BUSY_MESSAGE,
     CLIENT_ID,
     CLIENT_SECRET,
+    CODE_EXCHANGE_TTL_SECS,
     COGNITO_DOMAIN,
+    DEFAULT_SKILL,
     EVALUATION_METRIC_DESCRIPTION,
     EVALUATION_URL,
     GET_ACCESS_TOKEN_URL,
     GET_USER_INFO_URL,
+    GRADIO_CONCURRENCY_LIMIT,
+    GRADIO_QUEUE_MAX_SIZE,
     IS_DEVELOPER_VIEW,
     LOGIN_URL,
+    MAGE_URL,
     ON_LOCALHOST,
     REDIRECT_URL,
+    SESSION_STORE_URL,
     SKILL_NAME_TO_MCM_URL,
+    UVICORN_WORKERS,
 )
+from session_store import new_session_id, session_store
+from tracing import current_trace_context, span, traced
 from user_data import UserConfig
 
-IVY_BACKEND = "MAGE"
-IVY_SKILL = "Classification"
-MCM_URL = "https://classification.dilab-ivy.com/ivy/ask_question"
-MAGE_URL = "https://mage.dilab-ivy.com/ivy/ask_question"
-EVALUATION_QUESTIONS = []
-EVALUATION_QUESTION_NUM = 0
-USE_TEST_EVAL_DB = False
+# Per-session settings live in gr.State and the session store; these are only the defaults
+DEFAULT_BACKEND = "MCM"
+# Used when a request does not pass its own key/timeout (the settings components start with these)
+DEFAULT_MCM_API_KEY = "123456789"
+DEFAULT_TIMEOUT_SECS = 60
+
+fastapi_app = FastAPI()
+# Warm and health-check the backends in the background (see /healthz and /readyz)
+fastapi_app.router.add_event_handler("startup", backend_prober.start)
+fastapi_app.router.add_event_handler("shutdown", backend_prober.stop)
+# Release pooled backend connections when uvicorn shuts down
+fastapi_app.router.add_event_handler("shutdown", close_backend_clients)
+# Write out any chat logs still buffered in the write-behind queue
+fastapi_app.router.add_event_handler("shutdown", chat_history_writer.close)
+
+
+def start_evaluation_questions_warmup():
+    # Pre-load every skill's evaluation questions without delaying startup
+    threading.Thread(
+        target=warm_evaluation_questions_cache,
+        args=(list(SKILL_NAME_TO_MCM_URL),),
+        daemon=True,
+    ).start()
+
 
-app = FastAPI()
+fastapi_app.router.add_event_handler("startup", start_evaluation_questions_warmup)
 
 
-@app.get("/")
+@fastapi_app.get("/")
 def read_main():
     return RedirectResponse(url=LOGIN_URL)
 
 
+@fastapi_app.get("/healthz")
+def healthz():
+    # Liveness: the app is up; per-skill backend status is informational
+    return backend_prober.report()
+
+
+@fastapi_app.get("/readyz")
+def readyz():
+    report = backend_prober.report()
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
+
+
+@fastapi_app.get("/metrics")
+def metrics():
+    return Response(registry.render(), media_type=CONTENT_TYPE)
+
+
 def get_access_token_and_user_info(url_code):
-    global URL_CODE
-    URL_CODE = url_code
+    # Authorization codes are single use; a reload of the redirect page shortly after reuses the earlier exchange
+    cached_user = session_store.get(f"code:{url_code}")
+    if cached_user:
+        return UserConfig.from_dict(cached_user)
+
     access_token_data = {
         "grant_type": "authorization_code",
         "client_id": CLIENT_ID,
-        "code": URL_CODE,
+        "code": url_code,
         "redirect_uri": REDIRECT_URL,
     }
     access_token_headers = {
@@ -78,59 +141,178 @@ def get_access_token_and_user_info(url_code):
             GET_ACCESS_TOKEN_URL, data=access_token_data, headers=access_token_headers
         )
         access_token = response.json()["access_token"]
-        # Update Access token in constants/config file
-        UserConfig.ACCESS_TOKEN = access_token
 
         # Get User Info
         response = requests.get(
             GET_USER_INFO_URL, headers=get_user_info_header(access_token)
         ).json()
 
-        # Update User Info in constants/config file
-        UserConfig.USERNAME = response["username"]
-        UserConfig.USER_NAME = response["name"]
+        user = UserConfig(response["username"], response["name"], access_token)
+        session_store.set(
+            f"code:{url_code}", user.to_dict(), ttl_secs=CODE_EXCHANGE_TTL_SECS
+        )
 
         # Log user login in DynamoDB
-        log_user_login(UserConfig.USERNAME, UserConfig.ACCESS_TOKEN)
+        log_user_login(user.USERNAME, user.ACCESS_TOKEN)
 
-        return True
+        return user
     except Exception as e:
         print(str(e))
-        return False
+        return None
 
 
-def get_embed_response(
-    question: str, backend="", skill="", api_key="", timeout=None
+async def get_embed_response(
+    question: str, backend="", skill="", api_key="", timeout=None, course=""
 ) -> dict:
     print("Using Backend: ", backend)
+    started = time.monotonic()
+    api_key = api_key or DEFAULT_MCM_API_KEY
+    cached_response = response_cache.get(backend, skill, question, api_key)
+    if cached_response is not None:
+        observe_embed_response(backend, skill, "post", time.monotonic() - started, cache_hit=True)
+        return cached_response
+    if not backend_prober.is_available(backend, skill):
+        # Known to be down: fail fast instead of waiting for the timeout
+        print(f"{backend} ({skill}) is down, not sending the question")
+        return None
+
+    async def fetch():
+        if backend not in ("MCM", "MAGE"):
+            return None
+        async with concurrency_limiter.slot(backend, skill, course):
+            if backend == "MCM":
+                response = await get_mcm_response(
+                    question, SKILL_NAME_TO_MCM_URL[skill], api_key, timeout
+                )
+            else:
+                response = await get_mage_response(
+                    question, MAGE_URL, api_key, skill, timeout
+                )
+        if response and not response.is_error:
+            response_cache.put(
+                backend, skill, question, parse_response_json(response), api_key
+            )
+        return response
+
+    # Identical questions already in flight share one upstream request
+    response, coalesced = await single_flight.call(
+        get_flight_key(backend, skill, question, api_key), fetch
+    )
+    if coalesced:
+        print("Coalesced with in-flight request: ", backend, skill)
+    observe_embed_response(backend, skill, "post", time.monotonic() - started, coalesced=coalesced)
+    return response
+
+
+def get_embed_response_stream(
+    question: str, backend="", skill="", api_key="", timeout=None, course=""
+) -> BackendStream:
+    print("Using Backend: ", backend)
+    api_key = api_key or DEFAULT_MCM_API_KEY
+    cached_response = response_cache.get(backend, skill, question, api_key)
+    if cached_response is not None:
+        return CachedStream(cached_response)
     if backend == "MCM":
-        return get_mcm_response(
-            question, SKILL_NAME_TO_MCM_URL[skill], api_key, timeout
-        )
+        url, payload = SKILL_NAME_TO_MCM_URL[skill], get_mcm_payload(question, api_key)
     elif backend == "MAGE":
-        # TODO: update get_mage_response to return dict vs string
-        return get_mage_response(question, MAGE_URL, api_key, skill, timeout)
+        url, payload = MAGE_URL, get_mage_payload(question, api_key, skill)
+    else:
+        return None
+    if not backend_prober.is_available(backend, skill):
+        # Known to be down: fail fast instead of waiting for the timeout
+        print(f"{backend} ({skill}) is down, not sending the question")
+        return FailedStream(f"[{backend} request failed]")
+    # Identical questions already in flight share one upstream stream, which waits for a
+    # skill/backend slot before it is sent
+    return single_flight.stream(
+        get_flight_key(backend, skill, question, api_key),
+        lambda: concurrency_limiter.limit_stream(
+            BackendStream(url, payload, timeout or DEFAULT_TIMEOUT_SECS),
+            backend,
+            skill,
+            course,
+        ),
+    )
+
+
+def get_mcm_payload(question: str, api_key="") -> dict:
+    return {
+        "question": question,
+        "api_key": api_key or DEFAULT_MCM_API_KEY,
+        "Episodic_Knowledge": {},
+    }
+
+
+def get_mage_payload(question: str, api_key="", skill="") -> dict:
+    return {
+        "question": question,
+        "api_key": api_key or DEFAULT_MCM_API_KEY,
+        "skill": skill or DEFAULT_SKILL,
+    }
 
 
-def get_response(question: str) -> dict:
-    print("Using Backend: ", ivy_backend.value)
-    if ivy_backend.value == "MCM":
-        return get_mcm_response(question)
-    elif ivy_backend.value == "MAGE":
-        # TODO: update get_mage_response to return dict vs string
-        return get_mage_response(question)
+def record_stream_metrics(response_stream, backend, skill, text, started):
+    observe_embed_response(
+        backend,
+        skill,
+        "stream",
+        time.monotonic() - started,
+        cache_hit=response_stream.cache_hit,
+        coalesced=response_stream.coalesced,
+    )
+    streamed_bytes_total.inc(len((text or "").encode()), backend=backend, skill=skill)
+
+
+async def stream_answer(
+    history, response_stream, question, backend, skill, api_key, user_id, session_id
+):
+    """Streams the answer into the last history turn, then records metrics, caches the answer
+    (only a complete one) and logs the turn. Shared by the chat handlers of every page."""
+    started = time.monotonic()
+    # Forward text as the backend produces it (one chunk for non-streaming backends)
+    try:
+        with span("stream_response"):
+            async for history in throttled_render(history, response_stream):
+                yield history
+    except BackendBusyError:
+        history[-1][1] = BACKEND_BUSY_MESSAGE
+        yield history
+        return
+    record_stream_metrics(response_stream, backend, skill, history[-1][1], started)
+    # Only the request that actually reached the backend stores the answer, and a truncated or
+    # failed stream is never cached
+    if response_stream.complete and not (response_stream.cache_hit or response_stream.coalesced):
+        response_cache.put(
+            backend,
+            skill,
+            question,
+            response_stream.response_json,
+            api_key or DEFAULT_MCM_API_KEY,
+        )
+    # Log to DynamoDB every interaction here (boto3 is blocking, keep it off the event loop)
+    await asyncio.to_thread(
+        log_chat_history,
+        user_id,
+        session_id,
+        history[-1][0],
+        history[-1][1],
+        "no_reaction",
+        backend,
+        skill,
+        response_stream.response_json,
+        response_stream.cache_hit,
+        response_stream.coalesced,
+    )
 
 
-def get_mcm_response(question: str, mcm_url="", api_key="", timeout=None) -> dict:
+async def get_mcm_response(
+    question: str, mcm_url="", api_key="", timeout=None
+) -> dict:
     try:
-        response = httpx.post(
-            mcm_url or MCM_URL,
-            json={
-                "question": question,
-                "api_key": api_key or mcm_api_key.value,
-                "Episodic_Knowledge": {},
-            },
-            timeout=timeout or timeout_secs.value,
+        response = await post_question(
+            mcm_url or SKILL_NAME_TO_MCM_URL[DEFAULT_SKILL],
+            get_mcm_payload(question, api_key),
+            timeout or DEFAULT_TIMEOUT_SECS,
         )
         return response
     except httpx.RequestError as e:
@@ -141,20 +323,16 @@ def get_mcm_response(question: str, mcm_url="", api_key="", timeout=None) -> dic
         return ""
 
 
-def get_mage_response(
+async def get_mage_response(
     question: str, mage_url="", api_key="", skill="", timeout=None
-) -> str:
+) -> dict:
     try:
-        response = httpx.post(
+        response = await post_question(
             mage_url or MAGE_URL,
-            json={
-                "question": question,
-                "api_key": api_key or mcm_api_key.value,
-                "skill": skill or IVY_SKILL,
-            },
-            timeout=timeout or timeout_secs.value,
-        )
-        return response.json().get("response", "")
+            get_mage_payload(question, api_key, skill),
+            timeout or DEFAULT_TIMEOUT_SECS,
+        )
+        return response
     except httpx.RequestError as e:
         print(f"HTTP request failed: {e}")
         return ""
@@ -163,420 +341,515 @@ def get_mage_response(
         return ""
 
 
-with gr.Blocks(css="footer {display:none !important}") as ivy_embed_page:
-    session_settings = gr.State()
-    lti_data = gr.State()
-    # Title
-    embed_welcome_msg = gr.Markdown()
+####################################################################################
+# Gradio Pages
+####################################################################################
+# Pages are built by create_app rather than at import, so importing this module (or the
+# parent process of a multi-worker uvicorn) does not construct any Blocks.
 
-    embed_message = gr.Markdown("## Ivy Coach!")
-    embed_chat_area = gr.Chatbot(
-        label="Your Conversation",
-        show_copy_button=True,
-        placeholder="Your conversations will appear here...",
-        autoscroll=False,
-    )
-    embed_chatbox = gr.Textbox(
-        label="Ask a Question",
-        placeholder="Please enter your question here...",
-        show_copy_button=True,
-        autofocus=True,
-        show_label=True,
-    )
-    embed_submit_btn = gr.Button(value="Submit", variant="primary")
-
-    def on_page_load_ask_ivy_embed(request: gr.Request):
-        backend, skill, mcm_api_key, timeout = "", "", "123456789", 60
-        if "backend" in dict(request.query_params):
-            backend = dict(request.query_params)["backend"]
-        if backend not in ["MCM", "MAGE"]:
-            backend = "MCM"
-
-        if "skill" in dict(request.query_params):
-            skill = dict(request.query_params)["skill"]
-        if skill not in SKILL_NAME_TO_MCM_URL:
-            raise Exception("skill url param not supported")
-
-        if "mcm_api_key" in dict(request.query_params):
-            mcm_api_key = dict(request.query_params)["mcm_api_key"]
-        if "timeout" in dict(request.query_params):
-            timeout = dict(request.query_params)["timeout"]
-
-        session_settings = {
-            "backend": backend,
-            "skill": skill,
-            "mcm_api_key": mcm_api_key,
-            "timeout_secs": timeout,
-        }
 
-        lti_data_from_url_params = {
-            "user_id": "",
-            "full_name": "",
-            "session_id": "",
-            "user_role": "",
-            "course_id": "",
-        }
-        if "user_id" in dict(request.query_params):
-            lti_data_from_url_params["user_id"] = dict(request.query_params)["user_id"]
-        if "full_name" in dict(request.query_params):
-            lti_data_from_url_params["full_name"] = dict(request.query_params)[
-                "full_name"
-            ]
-        if "session_id" in dict(request.query_params):
-            lti_data_from_url_params["session_id"] = dict(request.query_params)[
-                "session_id"
-            ]
-        if "user_role" in dict(request.query_params):
-            lti_data_from_url_params["user_role"] = dict(request.query_params)[
-                "user_role"
-            ]
-        if "course_id" in dict(request.query_params):
-            lti_data_from_url_params["course_id"] = dict(request.query_params)[
-                "course_id"
-            ]
-        return [gr.State(session_settings), gr.State(lti_data_from_url_params)]
-
-    def update_user_message(user_message, history):
-        return "", history + [[user_message, None]]
-
-    def get_response_from_ivy(history, settings, lti_data):
-        history[-1][1] = ""
-        full_response_json = get_embed_response(
-            history[-1][0],
-            settings.value["backend"],
-            settings.value["skill"],
-            settings.value["mcm_api_key"],
-            settings.value["timeout_secs"],
-        )
-        # # Debugging: print the type and content of the response
-        # print("Type of full_response_json:", type(full_response_json))
-        # print("Content of full_response_json:", full_response_json)
-
-        # Check if full_response_json is non-empty and parse it safely
-        if isinstance(full_response_json, str) and full_response_json.strip():
-            try:
-                response_data = json.loads(full_response_json)
-            except json.JSONDecodeError:
-                print("Error: Received invalid JSON response")
-                response_data = {}  # Fallback to empty dict if JSON is invalid
-        elif hasattr(full_response_json, "json"):
-            # Assuming it's a response object from `requests` or similar library
-            try:
-                response_data = full_response_json.json()
-            except ValueError:
-                print("Error: Response object does not contain valid JSON")
-                response_data = {}
-        else:
-            print("Error: full_response_json is empty or in an unexpected format")
-            response_data = {}
-
-        response = response_data.get("response", "")
-
-        for character in response:
-            history[-1][1] += character
-            time.sleep(0.005)
-            yield history
-        # Log to DynamoDB every interaction here
-        log_chat_history(
-            lti_data.value["user_id"],
-            lti_data.value["session_id"],
-            history[-1][0],
-            history[-1][1],
-            "no_reaction",
-            settings.value["backend"],
-            settings.value["skill"],
-            full_response_json,
-        )
-
-    ivy_embed_page.load(
-        on_page_load_ask_ivy_embed,
-        [],
-        [session_settings, lti_data],
-    )
+def build_ivy_embed_page():
+    with gr.Blocks(css="footer {display:none !important}") as ivy_embed_page:
+        session_settings = gr.State()
+        lti_data = gr.State()
+        # Title
+        gr.Markdown()
 
-    embed_chatbox.submit(
-        update_user_message,
-        [embed_chatbox, embed_chat_area],
-        [embed_chatbox, embed_chat_area],
-        queue=False,
-    ).success(
-        get_response_from_ivy,
-        [embed_chat_area, session_settings, lti_data],
-        embed_chat_area,
-    )
-    embed_submit_btn.click(
-        update_user_message,
-        [embed_chatbox, embed_chat_area],
-        [embed_chatbox, embed_chat_area],
-        queue=False,
-    ).success(
-        get_response_from_ivy,
-        [embed_chat_area, session_settings, lti_data],
-        embed_chat_area,
-    )
-    embed_chat_area.like(
-        chat_liked_or_disliked, [embed_chat_area, lti_data, session_settings], None
-    )
+        gr.Markdown("## Ivy Coach!")
+        embed_chat_area = gr.Chatbot(
+            label="Your Conversation",
+            show_copy_button=True,
+            placeholder="Your conversations will appear here...",
+            autoscroll=False,
+        )
+        embed_chatbox = gr.Textbox(
+            label="Ask a Question",
+            placeholder="Please enter your question here...",
+            show_copy_button=True,
+            autofocus=True,
+            show_label=True,
+        )
+        embed_submit_btn = gr.Button(value="Submit", variant="primary")
+
+        def embed_trace(lti_data):
+            # Trace context stored by the page load; missing if the page load failed
+            return lti_data.value.get("trace") if lti_data else None
+
+        @traced("on_page_load_ask_ivy_embed", new_trace=True)
+        def on_page_load_ask_ivy_embed(request: gr.Request):
+            backend, skill, mcm_api_key, timeout = "", "", DEFAULT_MCM_API_KEY, DEFAULT_TIMEOUT_SECS
+            if "backend" in dict(request.query_params):
+                backend = dict(request.query_params)["backend"]
+            if backend not in ["MCM", "MAGE"]:
+                backend = "MCM"
+
+            if "skill" in dict(request.query_params):
+                skill = dict(request.query_params)["skill"]
+            if skill not in SKILL_NAME_TO_MCM_URL:
+                raise Exception("skill url param not supported")
+
+            if "mcm_api_key" in dict(request.query_params):
+                mcm_api_key = dict(request.query_params)["mcm_api_key"]
+            if "timeout" in dict(request.query_params):
+                timeout = dict(request.query_params)["timeout"]
+
+            session_settings = {
+                "backend": backend,
+                "skill": skill,
+                "mcm_api_key": mcm_api_key,
+                "timeout_secs": timeout,
+            }
+
+            lti_data_from_url_params = {
+                "user_id": "",
+                "full_name": "",
+                "session_id": "",
+                "user_role": "",
+                "course_id": "",
+            }
+            if "user_id" in dict(request.query_params):
+                lti_data_from_url_params["user_id"] = dict(request.query_params)["user_id"]
+            if "full_name" in dict(request.query_params):
+                lti_data_from_url_params["full_name"] = dict(request.query_params)[
+                    "full_name"
+                ]
+            if "session_id" in dict(request.query_params):
+                lti_data_from_url_params["session_id"] = dict(request.query_params)[
+                    "session_id"
+                ]
+            if "user_role" in dict(request.query_params):
+                lti_data_from_url_params["user_role"] = dict(request.query_params)[
+                    "user_role"
+                ]
+            if "course_id" in dict(request.query_params):
+                lti_data_from_url_params["course_id"] = dict(request.query_params)[
+                    "course_id"
+                ]
+            # Later events of this session join the page load's trace
+            lti_data_from_url_params["trace"] = current_trace_context()
+            return [gr.State(session_settings), gr.State(lti_data_from_url_params)]
+
+        @traced(
+            "update_user_message",
+            parent=lambda user_message, history, lti_data: embed_trace(lti_data),
+        )
+        def update_user_message(user_message, history, lti_data):
+            return "", trim_history(history + [[user_message, None]])
 
-# Launch the Application
-ivy_embed_page.queue()
+        @traced(
+            "get_response_from_ivy",
+            parent=lambda history, settings, lti_data: embed_trace(lti_data),
+        )
+        async def get_response_from_ivy(history, settings, lti_data):
+            history[-1][1] = ""
+            question, backend, skill = (
+                history[-1][0],
+                settings.value["backend"],
+                settings.value["skill"],
+            )
+            response_stream = get_embed_response_stream(
+                question,
+                backend,
+                skill,
+                settings.value["mcm_api_key"],
+                settings.value["timeout_secs"],
+                lti_data.value.get("course_id", ""),
+            )
+            async for history in stream_answer(
+                history,
+                response_stream,
+                question,
+                backend,
+                skill,
+                settings.value["mcm_api_key"],
+                lti_data.value["user_id"],
+                lti_data.value["session_id"],
+            ):
+                yield history
+
+        ivy_embed_page.load(
+            on_page_load_ask_ivy_embed,
+            [],
+            [session_settings, lti_data],
+        )
 
+        embed_chatbox.submit(
+            update_user_message,
+            [embed_chatbox, embed_chat_area, lti_data],
+            [embed_chatbox, embed_chat_area],
+            queue=False,
+        ).success(
+            get_response_from_ivy,
+            [embed_chat_area, session_settings, lti_data],
+            embed_chat_area,
+        )
+        embed_submit_btn.click(
+            update_user_message,
+            [embed_chatbox, embed_chat_area, lti_data],
+            [embed_chatbox, embed_chat_area],
+            queue=False,
+        ).success(
+            get_response_from_ivy,
+            [embed_chat_area, session_settings, lti_data],
+            embed_chat_area,
+        )
 
-# Gradio Interface Setup
-with gr.Blocks(css="footer {display:none !important}") as ivy_main_page:
-    # Title
-    welcome_msg = gr.Markdown()
-    # Settings
-    with gr.Row():
-        ivy_backend = gr.Dropdown(
-            choices=["MCM", "MAGE"],
-            value="MCM",
-            multiselect=False,
-            label="Backend",
-            interactive=True,
-        )
-        ivy_selected_skill = gr.Dropdown(
-            choices=SKILL_NAME_TO_MCM_URL.keys(),
-            value="Classification",
-            multiselect=False,
-            label="Skill",
-            interactive=True,
-        )
-        with gr.Accordion(
-            "Settings", open=False, visible=IS_DEVELOPER_VIEW
-        ) as settings_ask_ivy:
-            # MCM Settings
-            with gr.Group("MCM Settings"):
-                with gr.Row():
-                    # MCM API Key
-                    mcm_api_key = gr.Textbox(
-                        value="123456789",
-                        label="API Key",
-                        interactive=True,
-                    )
-                    timeout_secs = gr.Slider(
-                        label="Timeout (seconds)",
-                        minimum=5,
-                        maximum=300,
-                        step=5,
-                        value=60,
-                        interactive=True,
-                    )
-        goto_eval_page_btn = gr.Button(value="Evaluate Ivy")
-
-    chatbot = gr.Chatbot(
-        label="Your Conversation",
-        show_copy_button=True,
-        placeholder="Your conversations will appear here...",
-    )
-    msg = gr.Textbox(
-        label="Question",
-        placeholder="Please enter your question here...",
-        show_copy_button=True,
-        autofocus=True,
-        show_label=True,
+        def chat_liked_or_disliked(data: gr.LikeData, history, lti_data, session_settings):
+            log_reaction = log_commended_response if data.liked else log_disliked_response
+            if log_reaction(
+                [history[data.index[0]]],
+                session_settings.value["backend"],
+                session_settings.value["skill"],
+                lti_data.value["user_id"],
+                lti_data.value["session_id"],
+            ):
+                gr.Info("Saved successfully!")
+
+        embed_chat_area.like(
+            chat_liked_or_disliked, [embed_chat_area, lti_data, session_settings], None
+        )
+
+    # Launch the Application
+    ivy_embed_page.queue(
+        default_concurrency_limit=GRADIO_CONCURRENCY_LIMIT,
+        max_size=GRADIO_QUEUE_MAX_SIZE,
     )
-    with gr.Row():
-        submit = gr.Button(value="Submit", variant="primary")
-        clear = gr.Button(value="Clear", variant="stop")
-    with gr.Row(visible=IS_DEVELOPER_VIEW) as flag_download_button_grp_ask_ivy:
-        flag_btn = gr.Button(value="Flag last response", variant="secondary")
-        download_btn = gr.DownloadButton(
-            value="Download Flagged Responses",
-            variant="secondary",
-        )
-
-    def update_skill_ask_ivy(skill_name):
-        global IVY_SKILL
-        global MCM_URL
-        IVY_SKILL = skill_name
-        MCM_URL = SKILL_NAME_TO_MCM_URL[skill_name]
-        return []
-
-    def updte_ivy_backend(backend):
-        global IVY_BACKEND
-        print("Backend Updated: ", backend)
-        IVY_BACKEND = backend
-        return []
-
-    def on_page_load_ask_ivy(skill_name, request: gr.Request):
-        # Update visibility of certain components when Ivy is being embedded.
-        embed_mode = False
-        visibility_update = [gr.update(visible=True)] * 3
-        if "embed" in dict(request.query_params):
-            if dict(request.query_params)["embed"] == "true":
-                embed_mode = True
-                visibility_update = [gr.update(visible=False)] * 3
-
-        display_msg = "# Welcome to Ivy!"
-        if not embed_mode:
-            # If session data not already available, get access tokens.
-            if not UserConfig.ACCESS_TOKEN:
+    return ivy_embed_page
+
+
+# Gradio Interface Setup
+def build_ivy_main_page():
+    with gr.Blocks(css="footer {display:none !important}") as ivy_main_page:
+        # Per-session user and settings; also saved to the session store under its session_id
+        ask_ivy_session = gr.State()
+        # Carries the session_id to the "Evaluate Ivy" link (State values are not visible to js)
+        ask_ivy_session_id = gr.Textbox(visible=False)
+        # Title
+        welcome_msg = gr.Markdown()
+        # Settings
+        with gr.Row():
+            ivy_backend = gr.Dropdown(
+                choices=["MCM", "MAGE"],
+                value="MCM",
+                multiselect=False,
+                label="Backend",
+                interactive=True,
+            )
+            ivy_selected_skill = gr.Dropdown(
+                choices=SKILL_NAME_TO_MCM_URL.keys(),
+                value="Classification",
+                multiselect=False,
+                label="Skill",
+                interactive=True,
+            )
+            with gr.Accordion(
+                "Settings", open=False, visible=IS_DEVELOPER_VIEW
+            ) as settings_ask_ivy:
+                # MCM Settings
+                with gr.Group("MCM Settings"):
+                    with gr.Row():
+                        # MCM API Key
+                        mcm_api_key = gr.Textbox(
+                            value=DEFAULT_MCM_API_KEY,
+                            label="API Key",
+                            interactive=True,
+                        )
+                        timeout_secs = gr.Slider(
+                            label="Timeout (seconds)",
+                            minimum=5,
+                            maximum=300,
+                            step=5,
+                            value=DEFAULT_TIMEOUT_SECS,
+                            interactive=True,
+                        )
+            goto_eval_page_btn = gr.Button(value="Evaluate Ivy")
+
+        chatbot = gr.Chatbot(
+            label="Your Conversation",
+            show_copy_button=True,
+            placeholder="Your conversations will appear here...",
+        )
+        msg = gr.Textbox(
+            label="Question",
+            placeholder="Please enter your question here...",
+            show_copy_button=True,
+            autofocus=True,
+            show_label=True,
+        )
+        with gr.Row():
+            submit = gr.Button(value="Submit", variant="primary")
+            clear = gr.Button(value="Clear", variant="stop")
+        with gr.Row(visible=IS_DEVELOPER_VIEW) as flag_download_button_grp_ask_ivy:
+            flag_btn = gr.Button(value="Flag last response", variant="secondary")
+            download_btn = gr.DownloadButton(
+                value="Download Flagged Responses",
+                variant="secondary",
+            )
+
+        def update_skill_ask_ivy(skill_name, session):
+            session["skill"] = skill_name
+            session_store.set(session["session_id"], session)
+            return [], session
+
+        def updte_ivy_backend(backend, session):
+            print("Backend Updated: ", backend)
+            session["backend"] = backend
+            session_store.set(session["session_id"], session)
+            return session
+
+        @traced("on_page_load_ask_ivy", new_trace=True)
+        def on_page_load_ask_ivy(skill_name, backend, request: gr.Request):
+            # Update visibility of certain components when Ivy is being embedded.
+            embed_mode = False
+            visibility_update = [gr.update(visible=True)] * 3
+            if "embed" in dict(request.query_params):
+                if dict(request.query_params)["embed"] == "true":
+                    embed_mode = True
+                    visibility_update = [gr.update(visible=False)] * 3
+
+            user = UserConfig()
+            display_msg = "# Welcome to Ivy!"
+            if not embed_mode:
+                # Every page load starts a new session, so get access tokens for it.
                 if "code" not in dict(request.query_params):
                     # (TODO): Redirect to login page
                     display_msg = "Go back to login page"
                 else:
                     url_code = dict(request.query_params)["code"]
-                    if not get_access_token_and_user_info(url_code):
+                    signed_in_user = get_access_token_and_user_info(url_code)
+                    if not signed_in_user:
                         # (TODO): Redirect to Login page or display Error page
                         display_msg = "An Error Occurred"
                     else:
-                        display_msg = (
-                            f"# Welcome to Ivy Chatbot, {UserConfig.USER_NAME}"
-                        )
+                        user = signed_in_user
+                        display_msg = f"# Welcome to Ivy Chatbot, {user.USER_NAME}"
+
+            # Retrieve skill from query params if available.
+            if "skill" in dict(request.query_params):
+                skill_param = dict(request.query_params)["skill"]
+                if skill_param in SKILL_NAME_TO_MCM_URL:
+                    skill_name = skill_param
+
+            session = {
+                "session_id": new_session_id(),
+                "backend": backend,
+                "skill": skill_name,
+                "trace": current_trace_context(),
+                **user.to_dict(),
+            }
+            session_store.set(session["session_id"], session)
+
+            updated_mcm_skill_ask_ivy = gr.Dropdown(
+                choices=SKILL_NAME_TO_MCM_URL.keys(),
+                value=skill_name,
+                multiselect=False,
+                label="Skill",
+                interactive=True,
+                visible=(not embed_mode),
+            )
+            return (
+                [display_msg, updated_mcm_skill_ask_ivy]
+                + visibility_update
+                + [session, session["session_id"]]
+            )
 
-        # Retrieve skill from query params if available.
-        if "skill" in dict(request.query_params):
-            skill_param = dict(request.query_params)["skill"]
-            if skill_param in SKILL_NAME_TO_MCM_URL:
-                skill_name = skill_param
-        update_skill_ask_ivy(skill_name)
-
-        updated_mcm_skill_ask_ivy = gr.Dropdown(
-            choices=SKILL_NAME_TO_MCM_URL.keys(),
-            value=skill_name,
-            multiselect=False,
-            label="Skill",
-            interactive=True,
-            visible=(not embed_mode),
-        )
-        return [display_msg, updated_mcm_skill_ask_ivy] + visibility_update
-
-    def update_user_message(user_message, history):
-        return "", history + [[user_message, None]]
-
-    def get_response_from_ivy(history):
-        history[-1][1] = ""
-        full_response_json = get_response(history[-1][0])
-        response = full_response_json.json().get("response", "")
-        for character in response:
-            history[-1][1] += character
-            time.sleep(0.005)
-            yield history
-        # Log to DynamoDB every interaction here
-        log_chat_history(
-            UserConfig.USERNAME,
-            UserConfig.ACCESS_TOKEN,
-            history[-1][0],
-            history[-1][1],
-            "no_reaction",
-            IVY_BACKEND,
-            IVY_SKILL,
-            full_response_json,
-        )
-
-    def handle_download_click():
-        filepath = generate_csv(UserConfig.USERNAME, UserConfig.ACCESS_TOKEN)
-        return filepath if filepath else None
-
-    ivy_main_page.load(
-        on_page_load_ask_ivy,
-        [ivy_selected_skill],
-        [
-            welcome_msg,
-            ivy_selected_skill,
-            settings_ask_ivy,
-            clear,
-            flag_download_button_grp_ask_ivy,
-        ],
-    )
-    ivy_selected_skill.change(update_skill_ask_ivy, [ivy_selected_skill], [chatbot])
-    ivy_backend.change(updte_ivy_backend, [ivy_backend], [])
+        @traced(
+            "update_user_message",
+            parent=lambda user_message, history, session: (session or {}).get("trace"),
+        )
+        def update_user_message(user_message, history, session):
+            return "", trim_history(history + [[user_message, None]])
 
-    goto_eval_page_btn.click(
-        None, None, None, js=f"() => window.open('{EVALUATION_URL}', '_blank')"
-    )
-    msg.submit(
-        update_user_message, [msg, chatbot], [msg, chatbot], queue=False
-    ).success(get_response_from_ivy, chatbot, chatbot)
-    submit.click(
-        update_user_message, [msg, chatbot], [msg, chatbot], queue=False
-    ).success(get_response_from_ivy, chatbot, chatbot)
-    chatbot.like(chat_liked_or_disliked, chatbot, None)
-    clear.click(lambda: None, None, chatbot, queue=False)
-    flag_btn.click(log_flagged_response, chatbot, None)
-    download_btn.click(
-        handle_download_click,
-        inputs=[],
-        outputs=[download_btn],
+        @traced(
+            "get_response_from_ivy",
+            parent=lambda history, session, api_key, timeout: (session or {}).get("trace"),
+        )
+        async def get_response_from_ivy(history, session, api_key, timeout):
+            history[-1][1] = ""
+            question, backend, skill = history[-1][0], session["backend"], session["skill"]
+            response_stream = get_embed_response_stream(
+                question, backend, skill, api_key, timeout
+            )
+            async for history in stream_answer(
+                history,
+                response_stream,
+                question,
+                backend,
+                skill,
+                api_key,
+                session["username"],
+                session["access_token"],
+            ):
+                yield history
+
+        def on_chat_reaction(data: gr.LikeData, history, session):
+            log_reaction = log_commended_response if data.liked else log_disliked_response
+            if log_reaction(
+                [history[data.index[0]]],
+                session["backend"],
+                session["skill"],
+                session["username"],
+                session["access_token"],
+            ):
+                gr.Info("Saved successfully!")
+
+        def flag_last_response(history, session):
+            if log_flagged_response(
+                history,
+                session["backend"],
+                session["skill"],
+                session["username"],
+                session["access_token"],
+            ):
+                gr.Info("Saved successfully!")
+
+        def handle_download_click(session):
+            filepath = generate_csv(session["username"], session["access_token"])
+            return filepath if filepath else None
+
+        ivy_main_page.load(
+            on_page_load_ask_ivy,
+            [ivy_selected_skill, ivy_backend],
+            [
+                welcome_msg,
+                ivy_selected_skill,
+                settings_ask_ivy,
+                clear,
+                flag_download_button_grp_ask_ivy,
+                ask_ivy_session,
+                ask_ivy_session_id,
+            ],
+        )
+        ivy_selected_skill.change(
+            update_skill_ask_ivy,
+            [ivy_selected_skill, ask_ivy_session],
+            [chatbot, ask_ivy_session],
+        )
+        ivy_backend.change(
+            updte_ivy_backend, [ivy_backend, ask_ivy_session], [ask_ivy_session]
+        )
+
+        goto_eval_page_btn.click(
+            None,
+            [ask_ivy_session_id],
+            None,
+            js=f"(session_id) => window.open('{EVALUATION_URL}?ivy_session=' + session_id, '_blank')",
+        )
+        msg.submit(
+            update_user_message,
+            [msg, chatbot, ask_ivy_session],
+            [msg, chatbot],
+            queue=False,
+        ).success(
+            get_response_from_ivy,
+            [chatbot, ask_ivy_session, mcm_api_key, timeout_secs],
+            chatbot,
+        )
+        submit.click(
+            update_user_message,
+            [msg, chatbot, ask_ivy_session],
+            [msg, chatbot],
+            queue=False,
+        ).success(
+            get_response_from_ivy,
+            [chatbot, ask_ivy_session, mcm_api_key, timeout_secs],
+            chatbot,
+        )
+        chatbot.like(on_chat_reaction, [chatbot, ask_ivy_session], None)
+        clear.click(lambda: None, None, chatbot, queue=False)
+        flag_btn.click(flag_last_response, [chatbot, ask_ivy_session], None)
+        download_btn.click(
+            handle_download_click,
+            inputs=[ask_ivy_session],
+            outputs=[download_btn],
+        )
+
+    # Launch the Application
+    ivy_main_page.queue(
+        default_concurrency_limit=GRADIO_CONCURRENCY_LIMIT,
+        max_size=GRADIO_QUEUE_MAX_SIZE,
     )
+    return ivy_main_page
+
+
+def build_evaluation_page():
+    try:
+        evaluation_css = open("css/evaluation.css", "r").read()
+    except OSError:
+        print("Could not open/read css file at css/evaluation.css")
+        sys.exit()
+    with gr.Blocks(
+        theme=gr.themes.Default(
+            primary_hue=gr.themes.colors.teal, secondary_hue=gr.themes.colors.red
+        ),
+        css=evaluation_css,
+    ) as evaluation_page:
+        # Title
+        gr.Markdown()
+        # Settings
+        with gr.Row():
+            mcm_skill_evaluation = gr.Dropdown(
+                choices=SKILL_NAME_TO_MCM_URL.keys(),
+                value="Classification",
+                multiselect=False,
+                label="Skill",
+                interactive=True,
+            )
+            with gr.Accordion("Settings", open=False, visible=IS_DEVELOPER_VIEW):
+                # MCM Settings
+                with gr.Group("MCM Settings"):
+                    with gr.Row():
+                        # MCM API Key
+                        mcm_api_key = gr.Textbox(
+                            value=DEFAULT_MCM_API_KEY,
+                            label="MCM API Key",
+                            interactive=True,
+                        )
+                        timeout_secs = gr.Slider(
+                            label="Timeout (seconds)",
+                            minimum=5,
+                            maximum=300,
+                            step=5,
+                            value=DEFAULT_TIMEOUT_SECS,
+                            interactive=True,
+                        )
 
-# Launch the Application
-ivy_main_page.queue()
-
-try:
-    evaluation_css = open("css/evaluation.css", "r").read()
-except OSError:
-    print("Could not open/read css file at css/evaluation.css")
-    sys.exit()
-with gr.Blocks(
-    theme=gr.themes.Default(
-        primary_hue=gr.themes.colors.teal, secondary_hue=gr.themes.colors.red
-    ),
-    css=evaluation_css,
-) as evaluation_page:
-    # Title
-    welcome_msg = gr.Markdown()
-    # Settings
-    with gr.Row():
-        mcm_skill_evaluation = gr.Dropdown(
-            choices=SKILL_NAME_TO_MCM_URL.keys(),
-            value="Classification",
-            multiselect=False,
-            label="Skill",
-            interactive=True,
-        )
-        with gr.Accordion("Settings", open=False, visible=IS_DEVELOPER_VIEW):
-            # MCM Settings
-            with gr.Group("MCM Settings"):
-                with gr.Row():
-                    # MCM API Key
-                    mcm_api_key = gr.Textbox(
-                        value="123456789",
-                        label="MCM API Key",
-                        interactive=True,
-                    )
-                    timeout_secs = gr.Slider(
-                        label="Timeout (seconds)",
-                        minimum=5,
-                        maximum=300,
-                        step=5,
-                        value=60,
-                        interactive=True,
-                    )
-
-    progress_bar = gr.HTML()
-
-    with gr.Row():
-        question_text = gr.Textbox(
-            label="Evaluation Question",
-            value="",
-            interactive=True,
-            scale=5,
-        )
-        submit_question_button = gr.Button(value="Submit", variant="primary")
-        skip_question_button = gr.Button(value="Skip Question")
-
-    with gr.Row():
-        response_text1 = gr.Textbox(
-            label="Evaluation Response 1",
-            placeholder="Response from either MAGE / MCM will appear here..",
-            value="",
-            interactive=False,
-            scale=1,
-            lines=5,
-        )
-        response_text2 = gr.Textbox(
-            label="Evaluation Response 2",
-            placeholder="Response from either MAGE / MCM will appear here..",
-            value="",
-            interactive=False,
-            scale=1,
-            lines=5,
-        )
-
-    def get_metric_name(metric_name):
-        return f"""
+        # Per-session user, skill and evaluation progress
+        eval_session = gr.State()
+        # Filled by submit_rating_button_js with the selected ratings
+        eval_ratings = gr.Textbox(visible=False)
+        progress_bar = gr.HTML()
+
+        with gr.Row():
+            question_text = gr.Textbox(
+                label="Evaluation Question",
+                value="",
+                interactive=True,
+                scale=5,
+            )
+            submit_question_button = gr.Button(value="Submit", variant="primary")
+            skip_question_button = gr.Button(value="Skip Question")
+
+        with gr.Row():
+            response_text1 = gr.Textbox(
+                label="Evaluation Response 1",
+                placeholder="Response from either MAGE / MCM will appear here..",
+                value="",
+                interactive=False,
+                scale=1,
+                lines=5,
+            )
+            response_text2 = gr.Textbox(
+                label="Evaluation Response 2",
+                placeholder="Response from either MAGE / MCM will appear here..",
+                value="",
+                interactive=False,
+                scale=1,
+                lines=5,
+            )
+
+        def get_metric_name(metric_name):
+            return f"""
             <p>
                 <div class="tooltip">{metric_name}
                 <i class="fa fa-info-circle" style="font-size:10px;color:#007bff"></i>
@@ -585,8 +858,8 @@ with gr.Blocks(
             </p>
         """
 
-    metrics_evaluation_html = gr.HTML(
-        f"""
+        gr.HTML(
+            f"""
     <link rel="stylesheet" href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0-beta3/css/all.min.css">
     <div class='your-eval-container'>Enter your evaluations below</div> <br />
     <div class="eval-container">
@@ -645,17 +918,17 @@ with gr.Blocks(
             </tbody>
         </table>
     </div><br />"""
-    )
+        )
 
-    with gr.Row():
-        clear_button = gr.Button(value="Clear Rating", variant="stop")
-        submit_rating_button = gr.Button(value="Next Question", variant="primary")
+        with gr.Row():
+            clear_button = gr.Button(value="Clear Rating", variant="stop")
+            submit_rating_button = gr.Button(value="Next Question", variant="primary")
 
-    def get_eval_dot_html(num, color_style):
-        return f"""<div class="dot {color_style}">{num}</div>"""
+        def get_eval_dot_html(num, color_style):
+            return f"""<div class="dot {color_style}">{num}</div>"""
 
-    def create_progress_indicator(current_question):
-        progress_html = """
+        def create_progress_indicator(session):
+            progress_html = """
         <div class="top-container">
             <div>
                 <div class="progress-text">Evaluation Progress</div>
@@ -664,131 +937,148 @@ with gr.Blocks(
                 </div>
             </div>
         </div>"""
-        progress_dots_html = ""
-        for i in range(len(EVALUATION_QUESTIONS)):
-            if i < current_question:
-                style = "green-dot"
-            elif i > current_question:
-                style = "red-dot"
+            progress_dots_html = ""
+            current_question = session["question_num"]
+            for i in range(len(session["questions"])):
+                if i < current_question:
+                    style = "green-dot"
+                elif i > current_question:
+                    style = "red-dot"
+                else:
+                    style = "yellow-dot"
+                progress_dots_html += get_eval_dot_html(i + 1, style)
+            progress_html = progress_html % progress_dots_html
+            return progress_html
+
+        def get_evaluation_panel_text(result, backend):
+            # A failed backend still gets a panel, with a marker instead of an answer
+            if isinstance(result, asyncio.TimeoutError):
+                response = f"[{backend} did not respond before the timeout]"
+            elif isinstance(result, BackendBusyError):
+                response = f"[{backend} is busy, please try again]"
+            elif isinstance(result, BaseException) or not result:
+                response = f"[{backend} request failed]"
+            elif isinstance(result, httpx.Response) and result.is_error:
+                response = f"[{backend} request failed with status {result.status_code}]"
             else:
-                style = "yellow-dot"
-            progress_dots_html += get_eval_dot_html(i + 1, style)
-        progress_html = progress_html % progress_dots_html
-        return progress_html
-
-    def get_both_response(question: str):
-        resp1 = get_mcm_response(question).json().get("response", "")
-        # TODO: update get_mage_response to return dict vs str
-        resp2 = get_mage_response(question).json().get("response", "")
-
-        resp1 += "\n\n\n\n\n\n\n (MCM)"
-        resp2 += "\n\n\n\n\n\n\n (MAGE)"
-
-        # Randomly shuffle the responses
-        if random.randint(0, 1):
-            return resp1, resp2
-
-        return resp2, resp1
-
-    # Update response 1 and response 2 textboxes
-    submit_question_button.click(
-        get_both_response,
-        [question_text],
-        [response_text1, response_text2],
-    )
-
-    def get_submit_rating_btn():
-        if EVALUATION_QUESTION_NUM == len(EVALUATION_QUESTIONS) - 1:
-            return gr.Button(
-                value="Submit and Finish Evaluation",
-                variant="primary",
-                link="/post-eval",
+                response = parse_response_json(result).get("response", "")
+            return response + f"\n\n\n\n\n\n\n ({backend})"
+
+        async def get_both_response(question: str, api_key, timeout, session):
+            timeout = timeout or DEFAULT_TIMEOUT_SECS
+            skill = session["skill"]
+            # Query both backends at once under one shared deadline
+            mcm_result, mage_result = await asyncio.gather(
+                asyncio.wait_for(
+                    get_embed_response(question, "MCM", skill, api_key, timeout), timeout
+                ),
+                asyncio.wait_for(
+                    get_embed_response(question, "MAGE", skill, api_key, timeout), timeout
+                ),
+                return_exceptions=True,
             )
-        else:
-            return submit_rating_button
-
-    def get_skip_question_btn():
-        if EVALUATION_QUESTION_NUM == len(EVALUATION_QUESTIONS) - 1:
-            return gr.Button(value="Skip Question", interactive=False)
-        else:
-            return skip_question_button
-
-    def skip_eval_question():
-        global EVALUATION_QUESTION_NUM
-        EVALUATION_QUESTION_NUM += 1
-        return [
-            create_progress_indicator(EVALUATION_QUESTION_NUM),
-            EVALUATION_QUESTIONS[EVALUATION_QUESTION_NUM][1],
-            "",
-            "",
-            get_submit_rating_btn(),
-            get_skip_question_btn(),
-        ]
-
-    skip_question_button.click(
-        skip_eval_question,
-        [],
-        [
-            progress_bar,
-            question_text,
-            response_text1,
-            response_text2,
-            submit_rating_button,
-            skip_question_button,
-        ],
-    )
+            resp1 = get_evaluation_panel_text(mcm_result, "MCM")
+            resp2 = get_evaluation_panel_text(mage_result, "MAGE")
+
+            # Randomly shuffle the responses
+            if random.randint(0, 1):
+                return resp1, resp2
+
+            return resp2, resp1
+
+        # Update response 1 and response 2 textboxes
+        submit_question_button.click(
+            get_both_response,
+            [question_text, mcm_api_key, timeout_secs, eval_session],
+            [response_text1, response_text2],
+        )
+
+        def get_submit_rating_btn(session):
+            if session["question_num"] == len(session["questions"]) - 1:
+                return gr.Button(
+                    value="Submit and Finish Evaluation",
+                    variant="primary",
+                    link="/post-eval",
+                )
+            else:
+                return submit_rating_button
+
+        def get_skip_question_btn(session):
+            if session["question_num"] == len(session["questions"]) - 1:
+                return gr.Button(value="Skip Question", interactive=False)
+            else:
+                return skip_question_button
+
+        def skip_eval_question(session):
+            session["question_num"] += 1
+            return [
+                create_progress_indicator(session),
+                session["questions"][session["question_num"]][1],
+                "",
+                "",
+                get_submit_rating_btn(session),
+                get_skip_question_btn(session),
+                session,
+            ]
+
+        skip_question_button.click(
+            skip_eval_question,
+            [eval_session],
+            [
+                progress_bar,
+                question_text,
+                response_text1,
+                response_text2,
+                submit_rating_button,
+                skip_question_button,
+                eval_session,
+            ],
+        )
 
-    clear_evaluation_rating_js = """
+        clear_evaluation_rating_js = """
         function clear_selection() {
             selections = document.querySelectorAll('input[type="radio"]')
             selections.forEach(radio => {
                 radio.checked = false;
             })
         }"""
-    clear_button.click(
-        None,
-        inputs=[],
-        outputs=[],
-        js=clear_evaluation_rating_js,
-    )
+        clear_button.click(
+            None,
+            inputs=[],
+            outputs=[],
+            js=clear_evaluation_rating_js,
+        )
 
-    def submit_rating_clear_update_question(response_concatenated_eval_ratings):
-        global EVALUATION_QUESTION_NUM
-        response_texts, concatenated_eval_ratings = (
-            response_concatenated_eval_ratings.split("-response-eval-delim-")
-        )
-        response_text1, response_text2 = response_texts.split("-response-split-")
-
-        log_evaluation_response(
-            IVY_SKILL,
-            EVALUATION_QUESTIONS[EVALUATION_QUESTION_NUM][1],
-            EVALUATION_QUESTIONS[EVALUATION_QUESTION_NUM][0],
-            response_text1,
-            concatenated_eval_ratings.split(","),
-            USE_TEST_EVAL_DB,
-            IVY_BACKEND,
-        )
-        log_evaluation_response(
-            IVY_SKILL,
-            EVALUATION_QUESTIONS[EVALUATION_QUESTION_NUM][1],
-            EVALUATION_QUESTIONS[EVALUATION_QUESTION_NUM][0],
-            response_text2,
-            concatenated_eval_ratings.split(","),
-            USE_TEST_EVAL_DB,
-            IVY_BACKEND,
-        )
-
-        EVALUATION_QUESTION_NUM += 1
-        return [
-            create_progress_indicator(EVALUATION_QUESTION_NUM),
-            EVALUATION_QUESTIONS[EVALUATION_QUESTION_NUM][1],
-            "",
-            "",
-            get_submit_rating_btn(),
-            get_skip_question_btn(),
-        ]
-
-    submit_rating_button_js = """
+        def submit_rating_clear_update_question(
+            response_text1, response_text2, concatenated_eval_ratings, session
+        ):
+            question_type, question = session["questions"][session["question_num"]]
+            for response_text in (response_text1, response_text2):
+                log_evaluation_response(
+                    session["skill"],
+                    question,
+                    question_type,
+                    response_text,
+                    concatenated_eval_ratings.split(","),
+                    session["use_test_eval_db"],
+                    session["backend"],
+                    session["username"],
+                    session["access_token"],
+                )
+
+            session["question_num"] += 1
+            return [
+                create_progress_indicator(session),
+                session["questions"][session["question_num"]][1],
+                "",
+                "",
+                get_submit_rating_btn(session),
+                get_skip_question_btn(session),
+                session,
+            ]
+
+        # Returns one value per input; the eval_session slot is ignored since State stays on the server
+        submit_rating_button_js = """
         function fetch_ratings_and_clear(response_text1, response_text2) {
             metric1_value = document.querySelector('input[name="metric1"]:checked')?.value || 'None';
             metric2_value = document.querySelector('input[name="metric2"]:checked')?.value || 'None';
@@ -800,94 +1090,207 @@ with gr.Blocks(
                 radio.checked = false;
             });
 
-            return response_text1 + '-response-split-' + response_text2 + '-response-eval-delim-' + [metric1_value, metric2_value, metric3_value, metric4_value, metric5_value].join();
+            return [response_text1, response_text2, [metric1_value, metric2_value, metric3_value, metric4_value, metric5_value].join(), null];
         }
         """
 
-    submit_rating_button.click(
-        submit_rating_clear_update_question,
-        inputs=[response_text1, response_text2],
-        outputs=[
-            progress_bar,
-            question_text,
-            response_text1,
-            response_text2,
-            submit_rating_button,
-            skip_question_button,
-        ],
-        js=submit_rating_button_js,
-    )
+        submit_rating_button.click(
+            submit_rating_clear_update_question,
+            inputs=[response_text1, response_text2, eval_ratings, eval_session],
+            outputs=[
+                progress_bar,
+                question_text,
+                response_text1,
+                response_text2,
+                submit_rating_button,
+                skip_question_button,
+                eval_session,
+            ],
+            js=submit_rating_button_js,
+        )
 
-    def update_eval_questions(skill_name):
-        response = get_evaluation_questions(skill_name)
-        response = response.get("Items", [])
-        global EVALUATION_QUESTIONS
-        EVALUATION_QUESTIONS = []
-        global EVALUATION_QUESTION_NUM
-        EVALUATION_QUESTION_NUM = 0
-        for question_dict in response:
-            EVALUATION_QUESTIONS.append(
-                (question_dict["QuestionType"], question_dict["Question"])
-            )
-        random.shuffle(EVALUATION_QUESTIONS)
-
-    def update_skill_evaluation(skill_name):
-        global IVY_SKILL
-        IVY_SKILL = skill_name
-        global MCM_URL
-        MCM_URL = SKILL_NAME_TO_MCM_URL[skill_name]
-        update_eval_questions(skill_name)
-        return [
-            EVALUATION_QUESTIONS[EVALUATION_QUESTION_NUM][1],
-            "",
-            "",
-            create_progress_indicator(EVALUATION_QUESTION_NUM),
-        ]
-
-    def on_page_load_evaluation(skill_name, request: gr.Request):
-        if "eval_skill" in dict(request.query_params):
-            skill_param = dict(request.query_params)["eval_skill"]
-            if skill_param in SKILL_NAME_TO_MCM_URL:
-                skill_name = skill_param
-        update_skill_evaluation(skill_name)
-
-        if "use_test_eval_db" in dict(request.query_params):
-            global USE_TEST_EVAL_DB
-            USE_TEST_EVAL_DB = dict(request.query_params)["use_test_eval_db"] == "true"
-
-        first_question_to_display = update_skill_evaluation(skill_name)[0]
-        return [
-            create_progress_indicator(EVALUATION_QUESTION_NUM),
-            first_question_to_display,
-            skill_name,
-        ]
-
-    evaluation_page.load(
-        on_page_load_evaluation,
-        [mcm_skill_evaluation],
-        [progress_bar, question_text, mcm_skill_evaluation],
-    )
-    mcm_skill_evaluation.change(
-        update_skill_evaluation,
-        [mcm_skill_evaluation],
-        [question_text, response_text1, response_text2, progress_bar],
-    )
+        def update_eval_questions(skill_name, session):
+            response = get_evaluation_questions(skill_name)
+            response = response.get("Items", [])
+            session["questions"] = [
+                [question_dict["QuestionType"], question_dict["Question"]]
+                for question_dict in response
+            ]
+            session["question_num"] = 0
+            random.shuffle(session["questions"])
+
+        def update_skill_evaluation(skill_name, session):
+            session["skill"] = skill_name
+            update_eval_questions(skill_name, session)
+            return [
+                session["questions"][session["question_num"]][1],
+                "",
+                "",
+                create_progress_indicator(session),
+                session,
+            ]
+
+        def on_page_load_evaluation(skill_name, request: gr.Request):
+            # The "Evaluate Ivy" button links the signed-in Ask Ivy session
+            linked_session = {}
+            if "ivy_session" in dict(request.query_params):
+                linked_session = (
+                    session_store.get(dict(request.query_params)["ivy_session"]) or {}
+                )
+            session = {
+                "backend": linked_session.get("backend", "MAGE"),
+                "use_test_eval_db": False,
+                **UserConfig.from_dict(linked_session).to_dict(),
+            }
+
+            if "eval_skill" in dict(request.query_params):
+                skill_param = dict(request.query_params)["eval_skill"]
+                if skill_param in SKILL_NAME_TO_MCM_URL:
+                    skill_name = skill_param
+            if "use_test_eval_db" in dict(request.query_params):
+                session["use_test_eval_db"] = (
+                    dict(request.query_params)["use_test_eval_db"] == "true"
+                )
+
+            first_question_to_display = update_skill_evaluation(skill_name, session)[0]
+            return [
+                create_progress_indicator(session),
+                first_question_to_display,
+                skill_name,
+                session,
+            ]
+
+        evaluation_page.load(
+            on_page_load_evaluation,
+            [mcm_skill_evaluation],
+            [progress_bar, question_text, mcm_skill_evaluation, eval_session],
+        )
+        mcm_skill_evaluation.change(
+            update_skill_evaluation,
+            [mcm_skill_evaluation, eval_session],
+            [question_text, response_text1, response_text2, progress_bar, eval_session],
+        )
 
-with gr.Blocks(css="footer {display:none !important}") as post_eval_page:
-    gr.HTML(
-        f"<h1>Thank you for evaluating Ivy.</h1>You can close this window or go back to <a href='{EVALUATION_URL}' target='_self'>evaluation page</a> for evaluating another skill."
+    evaluation_page.queue(
+        default_concurrency_limit=GRADIO_CONCURRENCY_LIMIT,
+        max_size=GRADIO_QUEUE_MAX_SIZE,
     )
+    return evaluation_page
+
+
+def build_post_eval_page():
+    with gr.Blocks(css="footer {display:none !important}") as post_eval_page:
+        gr.HTML(
+            f"<h1>Thank you for evaluating Ivy.</h1>You can close this window or go back to <a href='{EVALUATION_URL}' target='_self'>evaluation page</a> for evaluating another skill."
+        )
+    return post_eval_page
+
 
-app = gr.mount_gradio_app(
-    app, ivy_embed_page, path="/ask-ivy-embed", root_path="/ask-ivy-embed"
+####################################################################################
+# Metrics read at scrape time
+####################################################################################
+
+# Filled in by create_app: page name -> Blocks, for the queue metrics below
+GRADIO_PAGES = {}
+
+
+def _gradio_queue_metrics(value):
+    for page_name, page in GRADIO_PAGES.items():
+        yield {"page": page_name}, value(page._queue)
+
+
+registry.callback(
+    "ivy_gradio_queue_depth",
+    "Events waiting in each page's Gradio queue.",
+    ("page",),
+    lambda: _gradio_queue_metrics(len),
 )
-app = gr.mount_gradio_app(app, ivy_main_page, path="/ask-ivy", root_path="/ask-ivy")
-app = gr.mount_gradio_app(
-    app, evaluation_page, path="/evaluation", root_path="/evaluation"
+registry.callback(
+    "ivy_gradio_active_events",
+    "Events currently being processed by each page's Gradio queue.",
+    ("page",),
+    lambda: _gradio_queue_metrics(lambda queue: queue.get_active_worker_count()),
 )
-app = gr.mount_gradio_app(
-    app, post_eval_page, path="/post-eval", root_path="/post-eval"
+registry.callback(
+    "ivy_chat_log_queue_depth",
+    "Chat history items waiting in the write-behind queue.",
+    (),
+    lambda: [({}, chat_history_writer.depth())],
 )
+registry.callback(
+    "ivy_response_cache",
+    "Response cache statistics (hits, misses, entries, size_bytes).",
+    ("stat",),
+    lambda: [({"stat": name}, value) for name, value in response_cache.stats().items()],
+)
+registry.callback(
+    "ivy_coalesced_requests_total",
+    "Backend requests answered by an identical request already in flight.",
+    (),
+    lambda: [({}, single_flight.coalesced_requests)],
+    type="counter",
+)
+registry.callback(
+    "ivy_concurrency_slots",
+    "Backend concurrency slots in use and requests waiting, per skill and per backend limit.",
+    ("scope", "name", "state"),
+    lambda: [
+        ({"scope": scope, "name": name, "state": state}, value)
+        for scope, limits in concurrency_limiter.stats().items()
+        for name, counts in limits.items()
+        for state, value in counts.items()
+    ],
+)
+registry.callback(
+    "ivy_circuit_open",
+    "1 while an endpoint's circuit breaker is open or half-open.",
+    ("endpoint",),
+    lambda: [
+        ({"endpoint": url}, int(stats["state"] != "closed"))
+        for url, stats in endpoint_stats().items()
+    ],
+)
+
+
+####################################################################################
+# Application
+####################################################################################
+
+
+@functools.lru_cache(maxsize=None)
+def create_app():
+    ivy_embed_page = build_ivy_embed_page()
+    ivy_main_page = build_ivy_main_page()
+    evaluation_page = build_evaluation_page()
+    GRADIO_PAGES.update(
+        {"ask-ivy-embed": ivy_embed_page, "ask-ivy": ivy_main_page, "evaluation": evaluation_page}
+    )
+    app = gr.mount_gradio_app(
+        fastapi_app, ivy_embed_page, path="/ask-ivy-embed", root_path="/ask-ivy-embed"
+    )
+    app = gr.mount_gradio_app(app, ivy_main_page, path="/ask-ivy", root_path="/ask-ivy")
+    app = gr.mount_gradio_app(
+        app, evaluation_page, path="/evaluation", root_path="/evaluation"
+    )
+    app = gr.mount_gradio_app(
+        app, build_post_eval_page(), path="/post-eval", root_path="/post-eval"
+    )
+    return app
+
+
+def __getattr__(name):
+    # `main.app` (what uvicorn loads for "main:app") builds the pages on first access
+    if name == "app":
+        return create_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8002)
+    if UVICORN_WORKERS > 1:
+        if SESSION_STORE_URL.startswith("memory://"):
+            print("Warning: memory:// session store is not shared between workers")
+        # Each worker imports the app and builds the pages itself. Gradio's event queue is per process, so the
+        # proxy in front of the workers needs session affinity.
+        uvicorn.run("main:app", host="0.0.0.0", port=8002, workers=UVICORN_WORKERS)
+    else:
+        uvicorn.run(create_app(), host="0.0.0.0", port=8002)
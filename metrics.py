@@ -0,0 +1,215 @@
+#####################################################################################################################
+# Description:
+# The metrics.py module collects the app's operational numbers and renders them in the Prometheus text format
+# for the /metrics endpoint. Counters and histograms are updated where the work happens (backend answers,
+# DynamoDB calls, chat turns); values that already live elsewhere (queue depths, cache statistics, circuit
+# state) are read through callbacks at scrape time. All metrics are thread-safe, since DynamoDB writes run in
+# worker threads.
+#   Usage: (1) Import: from metrics import registry, time_dynamodb_call
+#          (2) Call by: with time_dynamodb_call("log_user_login"): table.put_item(...)
+#                       registry.render()  # text body for /metrics
+#####################################################################################################################
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+from tracing import child_span
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+BACKEND_LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+DYNAMODB_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(label_names, label_values, extra=()):
+    pairs = list(zip(label_names, label_values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value is None:
+        return "NaN"
+    if isinstance(value, float) and math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name, documentation, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        return [
+            f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+            for key, value in values.items()
+        ]
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, label_names=(), buckets=BACKEND_LATENCY_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        with self._lock:
+            values = {key: (list(counts), total) for key, (counts, total) in self._values.items()}
+        lines = []
+        for key, (counts, total) in values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = _format_labels(self.label_names, key, [("le", _format_value(float(bound)))])
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class CallbackMetric(_Metric):
+    """A gauge or counter whose values are read at scrape time; `collect` returns (labels dict, value) pairs."""
+
+    def __init__(self, name, documentation, label_names=(), collect=None, type="gauge"):
+        super().__init__(name, documentation, label_names)
+        self.type = type
+        self.collect = collect
+
+    def samples(self):
+        try:
+            values = list(self.collect())
+        except Exception as e:
+            print(f"Error collecting metric {self.name}: {e}")
+            return []
+        return [
+            f"{self.name}{_format_labels(self.label_names, self._key(labels))} {_format_value(value)}"
+            for labels, value in values
+        ]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, label_names=()):
+        return self.register(Counter(name, documentation, label_names))
+
+    def histogram(self, name, documentation, label_names=(), buckets=BACKEND_LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, label_names, buckets))
+
+    def callback(self, name, documentation, label_names, collect, type="gauge"):
+        return self.register(CallbackMetric(name, documentation, label_names, collect, type))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.header())
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+####################################################################################
+# Application Metrics
+####################################################################################
+
+embed_response_seconds = registry.histogram(
+    "ivy_embed_response_seconds",
+    "Time to a complete answer, by backend, skill, mode (post/stream) and source (backend/cache/coalesced).",
+    ("backend", "skill", "mode", "source"),
+)
+streamed_bytes_total = registry.counter(
+    "ivy_streamed_bytes_total",
+    "Bytes of answer text streamed to chat clients.",
+    ("backend", "skill"),
+)
+chat_reactions_total = registry.counter(
+    "ivy_chat_reactions_total",
+    "Chat turns logged, by reaction (no_reaction, liked, disliked, flagged).",
+    ("reaction", "backend", "skill"),
+)
+dynamodb_call_seconds = registry.histogram(
+    "ivy_dynamodb_call_seconds",
+    "DynamoDB call latency by calling function.",
+    ("function",),
+    buckets=DYNAMODB_LATENCY_BUCKETS,
+)
+dynamodb_errors_total = registry.counter(
+    "ivy_dynamodb_errors_total",
+    "DynamoDB calls that raised, by calling function.",
+    ("function",),
+)
+
+
+@contextmanager
+def time_dynamodb_call(function):
+    started = time.perf_counter()
+    try:
+        with child_span(f"dynamodb.{function}"):
+            yield
+    except Exception:
+        dynamodb_errors_total.inc(function=function)
+        raise
+    finally:
+        dynamodb_call_seconds.observe(time.perf_counter() - started, function=function)
+
+
+def observe_embed_response(backend, skill, mode, seconds, cache_hit=False, coalesced=False):
+    source = "cache" if cache_hit else "coalesced" if coalesced else "backend"
+    embed_response_seconds.observe(seconds, backend=backend, skill=skill, mode=mode, source=source)
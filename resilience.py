@@ -0,0 +1,195 @@
+#####################################################################################################################
+# Description:
+# The resilience.py module keeps a slow or failing backend from holding every chat turn for the full timeout.
+# Each endpoint (one MCM skill URL or MAGE) has a CircuitBreaker: after repeated timeouts/errors it opens and
+# requests fail immediately with CircuitOpenError; after a cool-down one probe request is let through (half-open)
+# and its outcome closes or re-opens the circuit. Endpoints also track their recent latency, which is used to
+# hedge requests: if an attempt is slower than the observed p95, a second attempt is sent and the first
+# response wins, so tail latency follows the backend's real latency rather than the worst-case timeout.
+#   Usage: (1) Import: from resilience import get_endpoint
+#          (2) Call by: response = await get_endpoint(url).send(lambda: client.post(...), mode="post")
+#####################################################################################################################
+import asyncio
+import time
+from collections import deque
+
+import httpx
+
+from constants import (
+    CIRCUIT_FAILURE_THRESHOLD,
+    CIRCUIT_RECOVERY_SECS,
+    HEDGE_MIN_DELAY_SECS,
+    HEDGE_MIN_SAMPLES,
+    HEDGE_PERCENTILE,
+    HEDGE_REQUESTS,
+    LATENCY_WINDOW_SIZE,
+)
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name,
+        failure_threshold=CIRCUIT_FAILURE_THRESHOLD,
+        recovery_secs=CIRCUIT_RECOVERY_SECS,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_secs = recovery_secs
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+    def before_request(self):
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.recovery_secs:
+                raise CircuitOpenError(f"Circuit open for {self.name}")
+            self.state = "half_open"
+        if self.state == "half_open":
+            # Only one probe at a time; everything else keeps failing fast until it answers
+            if self._probing:
+                raise CircuitOpenError(f"Circuit half-open for {self.name}, probe in progress")
+            self._probing = True
+
+    def record_success(self):
+        self.state = "closed"
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self):
+        self._probing = False
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                print(f"Circuit opened for {self.name} after {self.failures} failures")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def record_cancelled(self):
+        # A cancelled probe says nothing about the backend; let the next request probe instead
+        self._probing = False
+
+
+class LatencyTracker:
+    def __init__(self, window_size=LATENCY_WINDOW_SIZE, min_samples=HEDGE_MIN_SAMPLES):
+        self._samples = deque(maxlen=window_size)
+        self.min_samples = min_samples
+
+    def record(self, seconds):
+        self._samples.append(seconds)
+
+    def percentile(self, q):
+        # None until enough requests have been seen to say anything about the tail
+        if not self._samples or len(self._samples) < self.min_samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class ResilientEndpoint:
+    def __init__(self, name):
+        self.name = name
+        self.breaker = CircuitBreaker(name)
+        # Time to first byte of a stream is not comparable to a complete answer, so each mode has its own window.
+        # Other modes (the health prober's "probe") only count towards the breaker and are never hedged.
+        self.latency = {"post": LatencyTracker(), "stream": LatencyTracker()}
+        self.hedged_requests = 0
+
+    def hedge_delay(self, mode):
+        if not HEDGE_REQUESTS or mode not in self.latency:
+            return None
+        p95 = self.latency[mode].percentile(HEDGE_PERCENTILE)
+        if p95 is None:
+            return None
+        return max(p95, HEDGE_MIN_DELAY_SECS)
+
+    async def _attempt(self, send, mode):
+        started = time.monotonic()
+        completed = False
+        try:
+            response = await send()
+            completed = True
+        except httpx.TransportError:
+            # Timeouts, refused/reset connections and protocol errors
+            completed = True
+            self.breaker.record_failure()
+            raise
+        finally:
+            if not completed:
+                self.breaker.record_cancelled()
+        if response.status_code >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+            if mode in self.latency:
+                self.latency[mode].record(time.monotonic() - started)
+        return response
+
+    async def send(self, send, mode="post"):
+        """`send` is called once per attempt and must return a new httpx.Response each time."""
+        self.breaker.before_request()
+        attempts = [asyncio.ensure_future(self._attempt(send, mode))]
+        winner = None
+        try:
+            delay = self.hedge_delay(mode)
+            if delay is not None:
+                done, _ = await asyncio.wait(attempts, timeout=delay)
+                if not done and self.breaker.state == "closed":
+                    self.hedged_requests += 1
+                    attempts.append(asyncio.ensure_future(self._attempt(send, mode)))
+
+            pending = set(attempts)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for attempt in done:
+                    if attempt.exception() is None:
+                        winner = attempt
+                        return attempt.result()
+                    error = attempt.exception()
+            raise error
+        finally:
+            await _discard_losers(attempts, winner)
+
+    def stats(self):
+        return {
+            "state": self.breaker.state,
+            "failures": self.breaker.failures,
+            "hedged_requests": self.hedged_requests,
+            "p95_secs": {mode: tracker.percentile(HEDGE_PERCENTILE) for mode, tracker in self.latency.items()},
+        }
+
+
+async def _discard_losers(attempts, winner):
+    # Cancel attempts still running and close responses that lost the race so their connections are released
+    for attempt in attempts:
+        if not attempt.done():
+            attempt.cancel()
+    for attempt in attempts:
+        if attempt is winner:
+            continue
+        try:
+            response = await attempt
+        except BaseException:
+            continue
+        await response.aclose()
+
+
+# Endpoints are keyed by URL: each MCM skill and MAGE degrade independently
+_endpoints = {}
+
+
+def get_endpoint(url):
+    endpoint = _endpoints.get(url)
+    if endpoint is None:
+        endpoint = _endpoints[url] = ResilientEndpoint(url)
+    return endpoint
+
+
+def endpoint_stats():
+    return {url: endpoint.stats() for url, endpoint in _endpoints.items()}
@@ -0,0 +1,134 @@
+#####################################################################################################################
+# Description:
+# The response_cache.py module caches backend answers keyed by (backend, skill, normalized question, API key hash).
+# Entries are evicted least-recently-used first once the cache exceeds its byte budget, and expire after a TTL.
+# Skills can opt out (e.g. when answers depend on state the question does not capture). Hit and miss counters
+# are kept for monitoring.
+#   Usage: (1) Import: from response_cache import response_cache
+#          (2) Call by: response_cache.get(backend, skill, question, api_key) / response_cache.put(..., response_json)
+#                       CachedStream(response_json) stands in for a BackendStream on a hit
+#####################################################################################################################
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from constants import (
+    RESPONSE_CACHE_DISABLED_SKILLS,
+    RESPONSE_CACHE_ENABLED,
+    RESPONSE_CACHE_MAX_BYTES,
+    RESPONSE_CACHE_TTL_SECS,
+)
+
+
+def normalize_question(question):
+    # Only surrounding and repeated whitespace is ignored: case and punctuation can change the meaning
+    # (e.g. Logic or RTP symbols)
+    return " ".join(question.split())
+
+
+def cache_key(backend, skill, question, api_key=""):
+    # An answer fetched with one caller's API key is only reused for callers with the same key; the key
+    # itself is not kept
+    api_key_hash = hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:16]
+    return (backend, skill, normalize_question(question), api_key_hash)
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        max_bytes=RESPONSE_CACHE_MAX_BYTES,
+        ttl_secs=RESPONSE_CACHE_TTL_SECS,
+        disabled_skills=RESPONSE_CACHE_DISABLED_SKILLS,
+        enabled=RESPONSE_CACHE_ENABLED,
+    ):
+        self.max_bytes = max_bytes
+        self.ttl_secs = ttl_secs
+        self.disabled_skills = set(disabled_skills)
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.size_bytes = 0
+        # key -> (response_json, size_bytes, stored_at)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def is_cacheable(self, skill):
+        return self.enabled and skill not in self.disabled_skills
+
+    def get(self, backend, skill, question, api_key=""):
+        if not self.is_cacheable(skill):
+            return None
+        key = cache_key(backend, skill, question, api_key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry[2] > self.ttl_secs:
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, backend, skill, question, response_json, api_key=""):
+        # Only complete answers are worth caching
+        if not self.is_cacheable(skill) or not response_json.get("response"):
+            return
+        key = cache_key(backend, skill, question, api_key)
+        size_bytes = len(key[2].encode("utf-8")) + len(
+            json.dumps(response_json).encode("utf-8")
+        )
+        if size_bytes > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (response_json, size_bytes, time.time())
+            self.size_bytes += size_bytes
+            while self.size_bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, backend=None, skill=None):
+        # Drops entries matching the given backend and/or skill (everything when neither is given)
+        with self._lock:
+            for key in list(self._entries):
+                if (backend is None or key[0] == backend) and (
+                    skill is None or key[1] == skill
+                ):
+                    self._remove(key)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "size_bytes": self.size_bytes,
+            }
+
+    def _remove(self, key):
+        # Caller holds self._lock
+        _, size_bytes, _ = self._entries.pop(key)
+        self.size_bytes -= size_bytes
+
+
+class CachedStream:
+    """Replays a cached answer through the same interface as backend_client.BackendStream."""
+
+    cache_hit = True
+    coalesced = False
+    complete = True
+
+    def __init__(self, response_json):
+        self.response_json = response_json
+        self.text = response_json.get("response", "")
+
+    async def __aiter__(self):
+        if self.text:
+            yield self.text
+
+
+response_cache = ResponseCache()
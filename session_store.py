@@ -0,0 +1,126 @@
+#####################################################################################################################
+# Description:
+# The session_store.py module keeps per-session data (who is logged in, current settings) outside of the process,
+# so any uvicorn worker can serve any page of a session. The store is chosen by IVY_SESSION_STORE:
+#   memory://                  - process local dictionary (single worker only)
+#   sqlite:///path/to/file.db  - shared file, for several workers on one host
+#   redis://host:port/db       - Redis (requires the optional `redis` package)
+#   Usage: (1) Import: from session_store import session_store, new_session_id
+#          (2) Call by: session_store.set(session_id, data) / session_store.get(session_id)
+#              (set takes an optional ttl_secs for entries that should expire sooner than sessions)
+#####################################################################################################################
+import json
+import secrets
+import sqlite3
+import threading
+import time
+
+from constants import SESSION_STORE_URL, SESSION_TTL_SECS
+
+
+def new_session_id():
+    return secrets.token_urlsafe(16)
+
+
+class InMemorySessionStore:
+    # Expired sessions are swept out on `set` at most this often, so abandoned sessions don't pile up
+    PURGE_INTERVAL_SECS = 60
+
+    def __init__(self, ttl_secs=SESSION_TTL_SECS):
+        self.ttl_secs = ttl_secs
+        # session_id -> (data, expires_at)
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._next_purge = time.time() + self.PURGE_INTERVAL_SECS
+
+    def get(self, session_id):
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            if entry[1] < time.time():
+                del self._sessions[session_id]
+                return None
+            return json.loads(entry[0])
+
+    def set(self, session_id, data, ttl_secs=None):
+        # Stored as JSON so every backend hands out independent copies
+        with self._lock:
+            now = time.time()
+            self._sessions[session_id] = (json.dumps(data), now + (ttl_secs or self.ttl_secs))
+            if now >= self._next_purge:
+                self._sessions = {
+                    key: entry for key, entry in self._sessions.items() if entry[1] >= now
+                }
+                self._next_purge = now + self.PURGE_INTERVAL_SECS
+
+    def delete(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+
+class SQLiteSessionStore:
+    def __init__(self, path, ttl_secs=SESSION_TTL_SECS):
+        self.path = path
+        self.ttl_secs = ttl_secs
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS sessions "
+                "(session_id TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        # A connection per call keeps the store safe across threads and worker processes
+        return sqlite3.connect(self.path, timeout=5)
+
+    def get(self, session_id):
+        with self._connect() as connection:
+            row = connection.execute(
+                "SELECT data FROM sessions WHERE session_id = ? AND expires_at >= ?",
+                (session_id, time.time()),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, session_id, data, ttl_secs=None):
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, data, expires_at) VALUES (?, ?, ?)",
+                (session_id, json.dumps(data), time.time() + (ttl_secs or self.ttl_secs)),
+            )
+            connection.execute("DELETE FROM sessions WHERE expires_at < ?", (time.time(),))
+
+    def delete(self, session_id):
+        with self._connect() as connection:
+            connection.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+
+class RedisSessionStore:
+    def __init__(self, url, ttl_secs=SESSION_TTL_SECS):
+        import redis
+
+        self.ttl_secs = ttl_secs
+        self._redis = redis.Redis.from_url(url)
+
+    def get(self, session_id):
+        data = self._redis.get(f"ivy:session:{session_id}")
+        return json.loads(data) if data else None
+
+    def set(self, session_id, data, ttl_secs=None):
+        self._redis.setex(f"ivy:session:{session_id}", ttl_secs or self.ttl_secs, json.dumps(data))
+
+    def delete(self, session_id):
+        self._redis.delete(f"ivy:session:{session_id}")
+
+
+def create_session_store(url=SESSION_STORE_URL):
+    if url.startswith("sqlite:///"):
+        return SQLiteSessionStore(url[len("sqlite:///") :])
+    if url.startswith("redis://") or url.startswith("rediss://"):
+        return RedisSessionStore(url)
+    if url.startswith("memory://"):
+        return InMemorySessionStore()
+    raise ValueError(f"Unsupported IVY_SESSION_STORE: {url}")
+
+
+session_store = create_session_store()
@@ -0,0 +1,119 @@
+#####################################################################################################################
+# Description:
+# The single_flight.py module coalesces identical in-flight backend questions.
+# While a (backend, skill, question, API key) request is running, further callers asking the same thing attach to it instead
+# of sending their own request: streamed answers are fanned out delta by delta to every subscriber, and plain calls
+# share one result. The upstream request runs in its own task, so a caller disconnecting does not cancel it for others.
+#   Usage: (1) Import: from single_flight import single_flight
+#          (2) Call by: stream = single_flight.stream(key, make_stream)   # stream.coalesced tells if it was shared
+#                       result, coalesced = await single_flight.call(key, fetch)
+#####################################################################################################################
+import asyncio
+
+from response_cache import cache_key
+
+
+def get_flight_key(backend, skill, question, api_key=""):
+    # Same key as the response cache: callers only share an answer fetched with their own API key
+    return cache_key(backend, skill, question, api_key)
+
+
+class _StreamFlight:
+    def __init__(self, source):
+        self.source = source
+        self.deltas = []
+        self.done = False
+        self.response_json = {}
+        self.complete = False
+        self.error = None
+        self._changed = asyncio.Event()
+        self.task = None
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def run(self, on_done):
+        try:
+            async for delta in self.source:
+                self.deltas.append(delta)
+                self._notify()
+        except Exception as e:
+            # Re-raised in every subscriber once the deltas received so far are replayed
+            self.error = e
+        finally:
+            self.response_json = self.source.response_json
+            self.complete = self.error is None and self.source.complete
+            self.done = True
+            on_done()
+            self._notify()
+
+
+class CoalescedStream:
+    """One subscriber's view of a shared in-flight stream; same interface as backend_client.BackendStream."""
+
+    cache_hit = False
+
+    def __init__(self, flight, coalesced):
+        self._flight = flight
+        self.coalesced = coalesced
+        self.text = ""
+        self.response_json = {}
+        self.complete = False
+
+    async def __aiter__(self):
+        position = 0
+        while True:
+            changed = self._flight._changed
+            if position < len(self._flight.deltas):
+                delta = self._flight.deltas[position]
+                position += 1
+                self.text += delta
+                yield delta
+            elif self._flight.done:
+                break
+            else:
+                await changed.wait()
+        self.response_json = self._flight.response_json
+        self.complete = self._flight.complete
+        if self._flight.error is not None:
+            raise self._flight.error
+
+
+class SingleFlight:
+    def __init__(self):
+        self._streams = {}
+        self._calls = {}
+        self.coalesced_requests = 0
+
+    def stream(self, key, make_stream):
+        # Must be called from the event loop; make_stream() is only invoked for the first caller
+        flight = self._streams.get(key)
+        if flight is not None:
+            self.coalesced_requests += 1
+            return CoalescedStream(flight, coalesced=True)
+
+        flight = _StreamFlight(make_stream())
+        self._streams[key] = flight
+        flight.task = asyncio.create_task(
+            flight.run(lambda: self._streams.pop(key, None))
+        )
+        return CoalescedStream(flight, coalesced=False)
+
+    async def call(self, key, fetch):
+        future = self._calls.get(key)
+        coalesced = future is not None
+        if coalesced:
+            self.coalesced_requests += 1
+        else:
+            future = asyncio.ensure_future(fetch())
+            self._calls[key] = future
+            future.add_done_callback(lambda _: self._calls.pop(key, None))
+        # Shielded so one caller being cancelled does not cancel the shared request
+        return await asyncio.shield(future), coalesced
+
+    def in_flight(self):
+        return len(self._streams) + len(self._calls)
+
+
+single_flight = SingleFlight()
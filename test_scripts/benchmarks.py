@@ -0,0 +1,317 @@
+############################################################################
+# For local development only!
+# Purpose: Microbenchmarks for the logging and export hot paths, in the style
+#          of pytest-benchmark (rounds, min/mean/median/stddev, ops/s).
+#          The sessionId_*.csv journeys in this directory are turned back into
+#          ChatHistory/VideoLogs items and served by in-memory stand-ins for
+#          the DynamoDB tables, so no AWS access is needed.
+# Usage: python test_scripts/benchmarks.py                  # run and save JSON
+#        python test_scripts/benchmarks.py -k csv --rounds 50
+#        python test_scripts/benchmarks.py --compare test_scripts/.benchmarks/<old>.json
+# Results are written to test_scripts/.benchmarks/<datetime>_<commit>.json.
+############################################################################
+import argparse
+import csv
+import glob
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(SCRIPTS_DIR)
+RESULTS_DIR = os.path.join(SCRIPTS_DIR, ".benchmarks")
+
+os.environ.setdefault("COGNITO_LOCALHOST_CLIENT_SECRET", "benchmark")
+os.environ.setdefault("COGNITO_PROD_CLIENT_SECRET", "benchmark")
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "benchmark")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "benchmark")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, SCRIPTS_DIR)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the logging/export microbenchmarks")
+    parser.add_argument("-k", dest="keyword", default="", help="Only run benchmarks whose name contains this")
+    parser.add_argument("--rounds", type=int, default=20, help="Timed rounds per benchmark")
+    parser.add_argument("--warmup", type=int, default=2, help="Untimed rounds per benchmark")
+    parser.add_argument("--output", help="Where to write the JSON results (default: .benchmarks/)")
+    parser.add_argument("--compare", help="Earlier results file to compare the medians against")
+    return parser.parse_args(argv)
+
+
+####################################################################################
+# Fixtures: journeys from sessionId_*.csv as DynamoDB items
+####################################################################################
+
+
+def _parse_submission(row):
+    # Inverse of parse_event_data: "3 out of 3 (100.00%)", "50.64 seconds", "The activity was completed."
+    raw, _, rest = row["Score"].partition(" out of ")
+    max_score, _, scaled = rest.partition(" (")
+    return {
+        "verb": "answered",
+        "object": row["Activity Question"],
+        "result": {
+            "duration": f"PT{row['Time Spent'].split(' ')[0] or 0}S",
+            "score": {"raw": int(raw or 0), "max": int(max_score or 0), "scaled": float(scaled.rstrip("%)") or 0) / 100},
+            "completion": row["Completion Status"] == "The activity was completed.",
+        },
+    }
+
+
+def load_journeys():
+    """session_id -> {"chat": [ChatHistory items], "video": [VideoLogs items]}"""
+    journeys = {}
+    for path in sorted(glob.glob(os.path.join(SCRIPTS_DIR, "sessionId_*.csv"))):
+        session_id = os.path.basename(path)[len("sessionId_") : -len(".csv")]
+        chat_items, video_items = [], []
+        with open(path, newline="", encoding="utf-8") as file:
+            for index, row in enumerate(csv.DictReader(file)):
+                timestamp = datetime.fromisoformat(row["Timestamp"])
+                if row["Chat Question"] or not row["Video EventType"]:
+                    chat_items.append(
+                        {
+                            "Username": f"user-{session_id}",
+                            "SessionId": session_id,
+                            "Timestamp": timestamp.strftime("%Y-%m-%dT%H-%M-%S"),
+                            "Question": row["Chat Question"],
+                            "Response": row["Chat Response"],
+                            # Every third turn is flagged so generate_csv has work to do
+                            "Reaction": "flagged" if index % 3 == 0 else "no_reaction",
+                            "FlaggedSessionId": session_id,
+                        }
+                    )
+                else:
+                    item = {
+                        "sessionId": session_id,
+                        "timestamp": timestamp.strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+                        "eventType": row["Video EventType"],
+                        "url": row["Video URL"],
+                    }
+                    if row["Video EventType"] == "submission" and row["Score"]:
+                        item["eventData"] = _parse_submission(row)
+                    video_items.append(item)
+        journeys[session_id] = {"chat": chat_items, "video": video_items}
+    return journeys
+
+
+class FakeTable:
+    """Answers query/scan from in-memory items; puts and updates are accepted and dropped."""
+
+    def __init__(self, name, items_by_session):
+        self.name = name
+        self.items_by_session = items_by_session
+
+    def query(self, **kwargs):
+        session_id = kwargs["KeyConditionExpression"].get_expression()["values"][1]
+        items = self.items_by_session.get(session_id, [])
+        if "FilterExpression" in kwargs:
+            items = [item for item in items if item.get("Reaction") == "flagged"]
+        return {"Items": items}
+
+    def scan(self, **kwargs):
+        return {"Items": [item for items in self.items_by_session.values() for item in items]}
+
+    def put_item(self, **kwargs):
+        return {}
+
+    def update_item(self, **kwargs):
+        return {}
+
+
+class FakeDynamoDBClient:
+    def batch_write_item(self, RequestItems):
+        return {"UnprocessedItems": {}}
+
+
+####################################################################################
+# Benchmark Runner
+####################################################################################
+
+
+class Benchmark:
+    def __init__(self, name, group, fn, setup=None):
+        self.name = name
+        self.group = group
+        self.fn = fn
+        self.setup = setup
+
+    def run(self, rounds, warmup):
+        timings = []
+        for round_number in range(warmup + rounds):
+            if self.setup:
+                self.setup()
+            started = time.perf_counter()
+            self.fn()
+            elapsed = time.perf_counter() - started
+            if round_number >= warmup:
+                timings.append(elapsed)
+        return {
+            "name": self.name,
+            "group": self.group,
+            "stats": {
+                "min": min(timings),
+                "max": max(timings),
+                "mean": statistics.mean(timings),
+                "median": statistics.median(timings),
+                "stddev": statistics.stdev(timings) if len(timings) > 1 else 0.0,
+                "rounds": len(timings),
+                "ops": 1 / statistics.mean(timings) if statistics.mean(timings) else 0.0,
+            },
+        }
+
+
+def collect_benchmarks(journeys, work_dir):
+    import backend_client
+    import chat_logging
+    import dev_query_chat_video_logs as journey_export
+    from write_behind import WriteBehindQueue
+
+    # Keep per-export log lines out of the timings
+    journey_export.logger.setLevel(logging.WARNING)
+    chat_by_session = {session_id: journey["chat"] for session_id, journey in journeys.items()}
+    video_by_session = {session_id: journey["video"] for session_id, journey in journeys.items()}
+    journey_export.chat_table = FakeTable("ChatHistory", chat_by_session)
+    journey_export.video_table = FakeTable("VideoLogs", video_by_session)
+    chat_logging._tables[chat_logging.CHAT_HISTORY_TABLE] = FakeTable("ChatHistory", chat_by_session)
+    chat_logging.chat_history_writer = WriteBehindQueue(FakeDynamoDBClient(), "ChatHistory", ("Username", "Timestamp"))
+    chat_logging.FLAGGED_EXPORT_DIR = os.path.join(work_dir, "flagged")
+
+    largest_session = max(journeys, key=lambda session_id: len(journeys[session_id]["chat"]) + len(journeys[session_id]["video"]))
+    chat_turns = [item for journey in journeys.values() for item in journey["chat"]]
+    submissions = [item["eventData"] for journey in journeys.values() for item in journey["video"] if "eventData" in item]
+    chat_timestamps = [item["Timestamp"] for item in chat_turns]
+    video_timestamps = [item["timestamp"] for journey in journeys.values() for item in journey["video"]]
+    full_response = {"response": "x" * 2000, "sources": [{"title": "Lesson 1", "score": 0.9}] * 5}
+    response_body = json.dumps(full_response)
+    sse_events = [json.dumps({"delta": f" token{index}"}) for index in range(200)] + [response_body, "[DONE]"]
+
+    def log_chat_turns():
+        for item in chat_turns:
+            chat_logging.log_chat_history(
+                item["Username"], item["SessionId"], item["Question"], item["Response"],
+                "no_reaction", "MCM", "Logic", full_response,
+            )
+
+    def generate_flagged_csvs():
+        for session_id, chat_items in chat_by_session.items():
+            if chat_items:
+                chat_logging.generate_csv(chat_items[0]["Username"], session_id)
+
+    def invalidate_flagged_csvs():
+        for session_id, chat_items in chat_by_session.items():
+            if chat_items:
+                chat_logging.invalidate_flagged_export(chat_items[0]["Username"], session_id)
+
+    def export_journeys():
+        for session_id in journeys:
+            journey_export.export_user_journey_to_csv(session_id)
+
+    def parse_submissions():
+        for event_data in submissions:
+            journey_export.parse_event_data(event_data)
+
+    def parse_chat_timestamps():
+        for timestamp in chat_timestamps:
+            datetime.strptime(timestamp, "%Y-%m-%dT%H-%M-%S")
+
+    def parse_video_timestamps():
+        for timestamp in video_timestamps:
+            datetime.strptime(timestamp, "%Y-%m-%dT%H:%M:%S.%fZ")
+
+    def parse_response_bodies():
+        for _ in range(100):
+            backend_client.parse_response_json(response_body)
+
+    def consume_sse_events():
+        stream = backend_client.BackendStream("", {}, 0)
+        for data in sse_events:
+            stream.text += stream._consume_event(data)
+
+    return [
+        Benchmark("log_chat_history", "chat_logging", log_chat_turns, chat_logging.chat_history_writer.flush),
+        Benchmark("generate_csv", "chat_logging", generate_flagged_csvs, invalidate_flagged_csvs),
+        Benchmark("export_user_journey_to_csv", "journey_export", export_journeys),
+        Benchmark("export_user_journey_to_csv[largest]", "journey_export", lambda: journey_export.export_user_journey_to_csv(largest_session)),
+        Benchmark("parse_event_data", "journey_export", parse_submissions),
+        Benchmark("get_chat_logs[timestamps]", "journey_export", parse_chat_timestamps),
+        Benchmark("get_video_logs[timestamps]", "journey_export", parse_video_timestamps),
+        Benchmark("get_chat_logs", "journey_export", lambda: [list(journey_export.get_chat_logs(s)) for s in journeys]),
+        Benchmark("get_video_logs", "journey_export", lambda: [list(journey_export.get_video_logs(s)) for s in journeys]),
+        Benchmark("parse_response_json", "response_parsing", parse_response_bodies),
+        Benchmark("BackendStream._consume_event", "response_parsing", consume_sse_events),
+    ]
+
+
+####################################################################################
+# Results
+####################################################################################
+
+
+def commit_info():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = bool(
+            subprocess.run(["git", "status", "--porcelain"], cwd=ROOT_DIR, capture_output=True, text=True).stdout.strip()
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return {"id": "unknown", "dirty": False}
+    return {"id": commit, "dirty": dirty}
+
+
+def print_results(results, baseline=None):
+    baseline_medians = {b["name"]: b["stats"]["median"] for b in (baseline or {}).get("benchmarks", [])}
+    print(f"{'Name':<40} {'Median (ms)':>12} {'Mean (ms)':>12} {'StdDev (ms)':>12} {'OPS':>10} {'vs base':>9}")
+    for result in results["benchmarks"]:
+        stats = result["stats"]
+        change = ""
+        if result["name"] in baseline_medians and baseline_medians[result["name"]]:
+            change = f"{(stats['median'] / baseline_medians[result['name']] - 1) * 100:+.1f}%"
+        print(
+            f"{result['name']:<40} {stats['median'] * 1000:>12.3f} {stats['mean'] * 1000:>12.3f} "
+            f"{stats['stddev'] * 1000:>12.3f} {stats['ops']:>10.1f} {change:>9}"
+        )
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    journeys = load_journeys()
+    original_dir = os.getcwd()
+    with tempfile.TemporaryDirectory() as work_dir:
+        # export_user_journey_to_csv writes sessionId_*.csv into the working directory; keep the fixtures intact
+        os.chdir(work_dir)
+        try:
+            benchmarks = [b for b in collect_benchmarks(journeys, work_dir) if args.keyword in b.name]
+            results = {
+                "machine_info": {"python_version": platform.python_version(), "machine": platform.machine(), "system": platform.system()},
+                "commit_info": commit_info(),
+                "datetime": datetime.now(timezone.utc).isoformat(),
+                "benchmarks": [benchmark.run(args.rounds, args.warmup) for benchmark in benchmarks],
+            }
+        finally:
+            os.chdir(original_dir)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+    print_results(results, baseline)
+
+    output = args.output or os.path.join(
+        RESULTS_DIR,
+        f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')}_{results['commit_info']['id']}.json",
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as file:
+        json.dump(results, file, indent=2)
+    print(f"Saved results to {output}")
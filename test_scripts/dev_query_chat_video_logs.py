@@ -1,21 +1,43 @@
 import argparse
+import copy
 import csv
-from datetime import datetime
+import hashlib
+import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+import heapq
 import boto3
-from boto3.dynamodb.conditions import Key
+from boto3.dynamodb.conditions import Attr, Key
+from botocore.config import Config
 from dotenv import load_dotenv
 import os
 import logging
+import threading
+import time
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def initialize_dynamodb():
+# Parallel scan segments used when there is no date index
+DEFAULT_SCAN_SEGMENTS = 8
+# How late (in seconds past its timestamp) an event may still show up and be picked up by --incremental
+DEFAULT_LAG_SECONDS = 600
+
+CHAT_TIMESTAMP_FORMAT = "%Y-%m-%dT%H-%M-%S"
+VIDEO_TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
+
+def initialize_dynamodb(max_pool_connections=10):
     global dynamodb, chat_table, video_table
     try:
-        # Initialize DynamoDB resource
-        dynamodb = boto3.resource('dynamodb', region_name=os.getenv("AWS_DEFAULT_REGION", "us-east-1"))
+        # Initialize DynamoDB resource. Exports only call Table.query/scan, which go straight through
+        # the resource's low-level client (thread-safe), so one resource and its connection pool are
+        # shared by all export workers; the pool is sized to the number of workers.
+        dynamodb = boto3.resource(
+            'dynamodb',
+            region_name=os.getenv("AWS_DEFAULT_REGION", "us-east-1"),
+            config=Config(max_pool_connections=max_pool_connections),
+        )
         chat_table = dynamodb.Table('ChatHistory')
         video_table = dynamodb.Table('VideoLogs')
         logger.info("Successfully connected to DynamoDB.")
@@ -23,65 +45,182 @@ def initialize_dynamodb():
         logger.error(f"Error initializing DynamoDB: {e}")
 
 
-def get_unique_session_ids_for_date(specified_date):
+# Optional VideoLogs GSI partitioned by day (hash key holds "YYYY-MM-DD"). When the table has it,
+# a day's sessions are read with a query instead of a scan. Returns (index name, hash key); both can
+# be set in the --env file, so they are read after it is loaded.
+def video_date_index():
+    return os.getenv("VIDEO_LOGS_DATE_INDEX", "DateIndex"), os.getenv("VIDEO_LOGS_DATE_INDEX_KEY", "date")
+
+
+def has_video_date_index():
+    index_name, index_key = video_date_index()
     try:
-        # Query VideoLogs for the specified date (filtering on timestamp)
-        response = video_table.scan(
-            FilterExpression=Key('timestamp').begins_with(specified_date)  # Filter by date (YYYY-MM-DD)
-        )
+        indexes = video_table.global_secondary_indexes or []
+    except Exception as e:
+        logger.warning(f"Could not describe VideoLogs, falling back to a scan: {e}")
+        return False
+    return any(
+        index["IndexName"] == index_name
+        and index.get("IndexStatus", "ACTIVE") == "ACTIVE"
+        and index["KeySchema"][0]["AttributeName"] == index_key
+        for index in indexes
+    )
 
-        # Extract unique sessionIds from the response
-        unique_session_ids = set(log['sessionId'] for log in response.get('Items', []))
+
+def query_session_ids_by_date(specified_date):
+    index_name, index_key = video_date_index()
+    items = query_all_items(
+        video_table,
+        IndexName=index_name,
+        KeyConditionExpression=Key(index_key).eq(specified_date),
+        ProjectionExpression="sessionId",
+    )
+    return {log["sessionId"] for log in items}
+
+
+# Scans VideoLogs as `total_segments` parallel segments, following every page and reading only sessionId
+def scan_session_ids_for_date(specified_date, total_segments=DEFAULT_SCAN_SEGMENTS):
+    def scan_segment(segment):
+        session_ids = set()
+        scan_kwargs = {
+            "FilterExpression": Attr("timestamp").begins_with(specified_date),  # Filter by date (YYYY-MM-DD)
+            "ProjectionExpression": "sessionId",
+            "Segment": segment,
+            "TotalSegments": total_segments,
+        }
+        while True:
+            response = video_table.scan(**scan_kwargs)
+            session_ids.update(log["sessionId"] for log in response.get("Items", []))
+            if "LastEvaluatedKey" not in response:
+                return session_ids
+            scan_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    with ThreadPoolExecutor(max_workers=total_segments) as executor:
+        return set().union(*executor.map(scan_segment, range(total_segments)))
+
+
+def get_unique_session_ids_for_date(specified_date, total_segments=DEFAULT_SCAN_SEGMENTS):
+    try:
+        unique_session_ids = None
+        if has_video_date_index():
+            try:
+                unique_session_ids = query_session_ids_by_date(specified_date)
+            except Exception as e:
+                logger.warning(f"Error querying {video_date_index()[0]}, falling back to a scan: {e}")
+        if unique_session_ids is None:
+            unique_session_ids = scan_session_ids_for_date(specified_date, max(1, total_segments))
 
         # Return as a sorted list
-        return sorted(list(unique_session_ids))
+        return sorted(unique_session_ids)
 
     except Exception as e:
         logger.error(f"Error querying VideoLogs for date {specified_date}: {e}")
         return []
 
 
-def get_chat_logs(session_id):
+# Attributes the exporter reads from each table. Everything else (e.g. ChatHistory's FullResponseJson)
+# is left in DynamoDB.
+CHAT_LOG_ATTRIBUTES = ("Username", "Timestamp", "Question", "Response")
+VIDEO_LOG_ATTRIBUTES = ("timestamp", "eventType", "url", "eventData")
+
+
+def projection(attributes):
+    # Placeholders for every name, since some (e.g. timestamp) are DynamoDB reserved words
+    return {
+        "ProjectionExpression": ", ".join(f"#{name}" for name in attributes),
+        "ExpressionAttributeNames": {f"#{name}": name for name in attributes},
+    }
+
+
+# Yields every item of a query, following LastEvaluatedKey. `limit` caps the items read per request.
+def query_all_items(table, limit=None, **query_kwargs):
+    if limit:
+        query_kwargs["Limit"] = limit
+    while True:
+        response = table.query(**query_kwargs)
+        yield from response.get("Items", [])
+        if "LastEvaluatedKey" not in response:
+            return
+        query_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+# Where a session's items are read from. Global secondary indexes only support eventually consistent
+# reads, so a consistent read queries the table itself, which is possible only when the table is keyed
+# like the index (session hash key, timestamp range key). Decided once per table: (table name, consistent) -> query kwargs
+_query_sources = {}
+_query_sources_lock = threading.Lock()
+
+
+def session_query_source(table, session_key, timestamp_key, consistent=False):
+    with _query_sources_lock:
+        if (table.name, consistent) not in _query_sources:
+            source = {"IndexName": "SessionIndex"}
+            if consistent:
+                try:
+                    if [key["AttributeName"] for key in table.key_schema] == [session_key, timestamp_key]:
+                        source = {"ConsistentRead": True}
+                except Exception as e:
+                    logger.warning(f"Could not describe {table.name}: {e}")
+                if "ConsistentRead" not in source:
+                    logger.warning(f"{table.name} is not keyed by {session_key}; reading SessionIndex (eventually consistent)")
+            _query_sources[(table.name, consistent)] = source
+        return _query_sources[(table.name, consistent)]
+
+
+# Yields a session's chat turns in Timestamp order, from the raw Timestamp `since` onwards when given
+def get_chat_logs(session_id, consistent=False, limit=None, since=None):
+    key_condition = Key("SessionId").eq(session_id)
+    if since:
+        key_condition &= Key("Timestamp").gte(since)
     try:
-        chat_response = chat_table.query(
-            IndexName="SessionIndex",
-            KeyConditionExpression=Key("SessionId").eq(session_id)
+        items = query_all_items(
+            chat_table,
+            limit,
+            KeyConditionExpression=key_condition,
+            **session_query_source(chat_table, "SessionId", "Timestamp", consistent),
+            **projection(CHAT_LOG_ATTRIBUTES),
         )
         # Only keep Question, Response, and standardized Timestamp fields
-        chat_logs = [
-            {
-                "Timestamp": datetime.strptime(log["Timestamp"], "%Y-%m-%dT%H-%M-%S"),
+        for log in items:
+            yield {
+                "Timestamp": datetime.strptime(log["Timestamp"], CHAT_TIMESTAMP_FORMAT),
+                "RawTimestamp": log["Timestamp"],
+                "Key": log.get("Username"),
                 "Question": log.get("Question"),
                 "Response": log.get("Response")
             }
-            for log in chat_response.get('Items', [])
-        ]
-        return chat_logs
     except Exception as e:
+        # Raised rather than exported as a journey without chat turns
         logger.error(f"Error querying ChatHistory: {e}")
-        return []
+        raise
 
 
-def get_video_logs(session_id):
+# Yields a session's video events in timestamp order, from the raw timestamp `since` onwards when given
+def get_video_logs(session_id, consistent=False, limit=None, since=None):
+    key_condition = Key("sessionId").eq(session_id)
+    if since:
+        key_condition &= Key("timestamp").gte(since)
     try:
-        video_response = video_table.query(
-            IndexName="SessionIndex",
-            KeyConditionExpression=Key("sessionId").eq(session_id)
+        items = query_all_items(
+            video_table,
+            limit,
+            KeyConditionExpression=key_condition,
+            **session_query_source(video_table, "sessionId", "timestamp", consistent),
+            **projection(VIDEO_LOG_ATTRIBUTES),
         )
         # Only keep eventType, url, and standardized Timestamp fields
-        video_logs = [
-            {
-                "Timestamp": datetime.strptime(log["timestamp"], "%Y-%m-%dT%H:%M:%S.%fZ"),
+        for log in items:
+            yield {
+                "Timestamp": datetime.strptime(log["timestamp"], VIDEO_TIMESTAMP_FORMAT),
+                "RawTimestamp": log["timestamp"],
+                "Key": log.get("eventType"),
                 "EventType": log.get("eventType"),
                 "URL": log.get("url"),
                 "eventData": log.get("eventData")  # Add eventData field
             }
-            for log in video_response.get('Items', [])
-        ]
-        return video_logs
     except Exception as e:
         logger.error(f"Error querying VideoLogs: {e}")
-        return []
+        raise
 
 
 #Extracts and formats fields from the eventData for CSV export
@@ -129,53 +268,258 @@ def parse_event_data(event_data):
     except Exception as e:
         logger.error(f"Error parsing eventData: {e}")
         return {}
-def export_user_journey_to_csv(session_id):
-    chat_logs = get_chat_logs(session_id)
-    video_logs = get_video_logs(session_id)
-
+CSV_HEADER = [
+    "Timestamp", "Chat Question", "Chat Response",
+    "Video EventType", "Video URL",
+    "Activity Question", "Time Spent", "Score", "Completion Status"
+]
+
+
+def chat_log_row(log):
+    return [
+        log["Timestamp"], log["Question"], log["Response"],
+        "", "", "", "", "", ""
+    ]
+
+
+def video_log_row(log):
+    # Default values for additional columns
+    activity_title = time_spent = score = completion_status = ""
+
+    if log["EventType"] == "submission" and "eventData" in log:
+        # Parse the eventData using the parse_event_data function
+        parsed_data = parse_event_data(log["eventData"])
+        activity_title = parsed_data.get("Activity Title", "")
+        time_spent = parsed_data.get("Time Spent", "")
+        score = parsed_data.get("Score", "")
+        completion_status = parsed_data.get("Completion Status", "")
+
+    return [
+        log["Timestamp"], "", "", log["EventType"], log["URL"],
+        activity_title, time_spent, score, completion_status
+    ]
+
+
+# Event sources of a journey: (name, fetch(session_id, consistent, limit, since) yielding logs with a
+# RawTimestamp in timestamp order and a Key telling apart events at the same timestamp, to_row(log) ->
+# CSV row, raw timestamp format). Another source, e.g. sign-ins from UserLogin, only needs an entry
+# here. On equal timestamps, earlier sources come first.
+JOURNEY_SOURCES = [
+    ("chat", get_chat_logs, chat_log_row, CHAT_TIMESTAMP_FORMAT),
+    ("video", get_video_logs, video_log_row, VIDEO_TIMESTAMP_FORMAT),
+]
+
+
+def _journey_events(name, logs, to_row, seen=()):
+    # Events in `seen` were written by an earlier export
+    seen = {tuple(event) for event in seen}
+    for log in logs:
+        if (log["RawTimestamp"], log["Key"]) in seen:
+            continue
+        yield log["Timestamp"], name, log["RawTimestamp"], log["Key"], to_row(log)
+
+
+# Raw timestamp from which a source is re-queried: `lag_seconds` before its high-water mark, so events
+# that reached the table late with an older timestamp are still found
+def window_start(mark, timestamp_format, lag_seconds):
+    after = datetime.strptime(mark["after"], timestamp_format)
+    return (after - timedelta(seconds=lag_seconds)).strftime(timestamp_format)
+
+
+# Yields (timestamp, source name, raw timestamp, key, CSV row) for every event of the session, oldest
+# first. `marks` from a checkpoint (source name -> {"after": newest raw timestamp exported, "since":
+# where the next run re-queries from, "seen": [raw timestamp, key] of the events exported since then})
+# limit this to events not exported yet. The sources are merged with a heap, so only one pending
+# event (and one query page) per source is held at a time.
+def merge_journey_events(session_id, consistent=False, limit=None, marks=None, sources=JOURNEY_SOURCES):
+    marks = marks or {}
+    streams = []
+    for name, fetch, to_row, _ in sources:
+        mark = marks.get(name) or {"since": None, "seen": []}
+        logs = fetch(session_id, consistent, limit, mark["since"])
+        streams.append(_journey_events(name, logs, to_row, mark["seen"]))
+    return heapq.merge(*streams, key=lambda event: event[0])
+
+
+def advance_mark(marks, name, raw_timestamp, key):
+    mark = marks.setdefault(name, {"after": raw_timestamp, "since": None, "seen": []})
+    mark["after"] = max(mark["after"], raw_timestamp)
+    mark["seen"].append([raw_timestamp, key])
+
+
+# Moves each source's re-query window up to its new high-water mark, forgetting events before it
+def close_marks(marks, lag_seconds, sources=JOURNEY_SOURCES):
+    for name, _, _, timestamp_format in sources:
+        mark = marks.get(name)
+        if mark:
+            mark["since"] = window_start(mark, timestamp_format, lag_seconds)
+            mark["seen"] = [event for event in mark["seen"] if event[0] >= mark["since"]]
+
+
+# Writes the events' rows, advancing `marks` when the export is checkpointed
+def write_journey_rows(file, events, marks=None):
+    writer = csv.writer(file)
+    rows = 0
+    for _, name, raw_timestamp, key, row in events:
+        writer.writerow(row)
+        if marks is not None:
+            advance_mark(marks, name, raw_timestamp, key)
+        rows += 1
+    return rows
+
+
+def journey_filename(session_id):
     # Get the first 10 characters of the sessionId and first 5 characters of the userId
     session_id_prefix = session_id[:15]
 
     # Generate the filename using the prefixes
     # if filename is None:
-    filename = f"sessionId_{session_id_prefix}.csv"
-
-    # Combine and sort logs by timestamp
-    combined_logs = sorted(chat_logs + video_logs, key=lambda x: x["Timestamp"])
-
-    # Write to CSV
-    with open(filename, mode="w", newline="", encoding="utf-8") as file:
-        writer = csv.writer(file)
-        writer.writerow([
-            "Timestamp", "Chat Question", "Chat Response",
-            "Video EventType", "Video URL",
-            "Activity Question", "Time Spent", "Score", "Completion Status"
-        ])
-
-        for log in combined_logs:
-            if "Question" in log:  # It's a chat log
-                writer.writerow([
-                    log["Timestamp"], log["Question"], log["Response"],
-                    "", "", "", "", "", ""
-                ])
-            elif "EventType" in log:  # It's a video log
-                # Default values for additional columns
-                activity_title = time_spent = score = completion_status = ""
-
-                if log["EventType"] == "submission" and "eventData" in log:
-                    # Parse the eventData using the parse_event_data function
-                    parsed_data = parse_event_data(log["eventData"])
-                    activity_title = parsed_data.get("Activity Title", "")
-                    time_spent = parsed_data.get("Time Spent", "")
-                    score = parsed_data.get("Score", "")
-                    completion_status = parsed_data.get("Completion Status", "")
-
-                writer.writerow([
-                    log["Timestamp"], "", "", log["EventType"], log["URL"],
-                    activity_title, time_spent, score, completion_status
-                ])
-
-    logger.info(f"User journey exported to {filename}")
+    return f"sessionId_{session_id_prefix}.csv"
+
+
+####################################################################################
+# Incremental Exports
+####################################################################################
+
+
+# Per-session export state in a JSON-lines file: the CSV's size and a hash of its last bytes when the
+# session was checkpointed, its row count and each source's high-water mark. Every finished session
+# appends a line, so an interrupted run keeps what it completed; the file is compacted when loaded.
+# Each run re-reads the last `lag_seconds` before the marks and appends the events it had not seen.
+class ExportCheckpoint:
+    TAIL_BYTES = 1024
+
+    def __init__(self, path, lag_seconds=DEFAULT_LAG_SECONDS):
+        self.path = path
+        self.lag_seconds = lag_seconds
+        self.sessions = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as file:
+                for line in file:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # Cut off by an interrupted run
+                    self.sessions[record["session_id"]] = record
+            self._compact()
+
+    def get(self, session_id):
+        with self._lock:
+            return self.sessions.get(session_id)
+
+    def update(self, session_id, filename, rows, marks):
+        record = {
+            "session_id": session_id,
+            "file": filename,
+            "size": os.path.getsize(filename),
+            "tail": self.file_tail(filename, os.path.getsize(filename)),
+            "rows": rows,
+            "marks": marks,
+            "updated": datetime.now(timezone.utc).isoformat(),
+        }
+        with self._lock:
+            self.sessions[session_id] = record
+            with open(self.path, "a", encoding="utf-8") as file:
+                file.write(json.dumps(record) + "\n")
+                file.flush()
+                os.fsync(file.fileno())
+
+    # Checks that `filename` still starts with what was checkpointed, dropping rows appended after it
+    # by an interrupted run. False when the file is missing or was rewritten since.
+    def restore(self, filename, record):
+        if not os.path.exists(filename) or os.path.getsize(filename) < record["size"]:
+            return False
+        if self.file_tail(filename, record["size"]) != record["tail"]:
+            return False
+        if os.path.getsize(filename) > record["size"]:
+            logger.info(f"Discarding rows appended to {filename} after its last checkpoint")
+            os.truncate(filename, record["size"])
+        return True
+
+    @classmethod
+    def file_tail(cls, filename, size):
+        with open(filename, "rb") as file:
+            file.seek(max(0, size - cls.TAIL_BYTES))
+            return hashlib.sha256(file.read(min(size, cls.TAIL_BYTES))).hexdigest()
+
+    def _compact(self):
+        compacted_path = f"{self.path}.tmp"
+        with open(compacted_path, "w", encoding="utf-8") as file:
+            for record in self.sessions.values():
+                file.write(json.dumps(record) + "\n")
+        os.replace(compacted_path, self.path)
+
+
+# Exports a session's journey and returns the number of rows written. With a checkpoint, a session
+# exported before only gets the events it does not have yet appended: those after its high-water
+# marks, and those that arrived late within the checkpoint's lag window. Late events are appended
+# after rows already written, so such a file is not strictly in timestamp order; an event arriving
+# more than the lag window late is not exported until the session is exported in full.
+def export_user_journey_to_csv(session_id, consistent=False, limit=None, checkpoint=None):
+    filename = journey_filename(session_id)
+    record = checkpoint.get(session_id) if checkpoint else None
+    if record and not checkpoint.restore(filename, record):
+        logger.warning(f"{filename} does not match its checkpoint; exporting session {session_id} in full")
+        record = None
+
+    if record:
+        marks = copy.deepcopy(record["marks"])
+        with open(filename, mode="a", newline="", encoding="utf-8") as file:
+            rows = write_journey_rows(file, merge_journey_events(session_id, consistent, limit, marks), marks)
+            file.flush()
+            os.fsync(file.fileno())
+        total_rows = record["rows"] + rows
+    else:
+        # Rows are written as they are merged; the file only replaces an earlier export once complete
+        marks = {} if checkpoint else None
+        partial_filename = f"{filename}.partial"
+        try:
+            with open(partial_filename, mode="w", newline="", encoding="utf-8") as file:
+                csv.writer(file).writerow(CSV_HEADER)
+                rows = write_journey_rows(file, merge_journey_events(session_id, consistent, limit), marks)
+            os.replace(partial_filename, filename)
+        except BaseException:
+            if os.path.exists(partial_filename):
+                os.remove(partial_filename)
+            raise
+        total_rows = rows
+
+    if checkpoint:
+        close_marks(marks, checkpoint.lag_seconds)
+        checkpoint.update(session_id, filename, total_rows, marks)
+    logger.info(f"User journey exported to {filename} ({rows} new rows)")
+    return rows
+
+
+# Exports sessions on a pool of `workers` threads. A failing session is logged and counted without
+# stopping the others; returns {"exported", "failed", "rows", "elapsed"}.
+def export_sessions(session_ids, workers=1, consistent=False, limit=None, checkpoint=None):
+    started = time.perf_counter()
+    exported, failed, rows = 0, [], 0
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {executor.submit(export_user_journey_to_csv, session_id, consistent, limit, checkpoint): session_id for session_id in session_ids}
+        for future in as_completed(futures):
+            session_id = futures[future]
+            try:
+                rows += future.result()
+                exported += 1
+            except Exception as e:
+                logger.error(f"Error exporting session {session_id}: {e}")
+                failed.append(session_id)
+    return {"exported": exported, "failed": failed, "rows": rows, "elapsed": time.perf_counter() - started}
+
+
+def log_export_summary(summary):
+    elapsed = summary["elapsed"]
+    sessions_per_sec = summary["exported"] / elapsed if elapsed else 0.0
+    rows_per_sec = summary["rows"] / elapsed if elapsed else 0.0
+    logger.info(
+        f"Exported {summary['exported']} sessions ({summary['rows']} rows) in {elapsed:.1f}s: "
+        f"{sessions_per_sec:.1f} sessions/s, {rows_per_sec:.0f} rows/s; {len(summary['failed'])} failed"
+    )
+    for session_id in summary["failed"]:
+        logger.warning(f"Failed session: {session_id}")
 
 
 # Main function to handle user inputs and process the data
@@ -195,6 +539,46 @@ def main():
         required=True,
         help="Date for filtering session logs (Format: YYYY-MM-DD)"
     )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        help="Number of sessions to export concurrently"
+    )
+    parser.add_argument(
+        '--scan-segments',
+        type=int,
+        default=DEFAULT_SCAN_SEGMENTS,
+        help="Parallel scan segments for finding the day's sessions when VideoLogs has no date index"
+    )
+    parser.add_argument(
+        '--consistent',
+        action='store_true',
+        help="Use strongly consistent reads where the table allows it (tables keyed by session id)"
+    )
+    parser.add_argument(
+        '--limit',
+        type=int,
+        help="Maximum items per DynamoDB query page (default: up to 1 MB per page)"
+    )
+    parser.add_argument(
+        '--incremental',
+        action='store_true',
+        help="Append only events newer than the checkpoint to existing exports (a full export otherwise)"
+    )
+    parser.add_argument(
+        '--checkpoint',
+        type=str,
+        default="journey_export_checkpoint.jsonl",
+        help="Checkpoint file used by --incremental"
+    )
+    parser.add_argument(
+        '--lag-seconds',
+        type=int,
+        default=DEFAULT_LAG_SECONDS,
+        help="With --incremental, re-read this many seconds before each session's last exported event, "
+             "so events that arrive late are still appended"
+    )
 
     # Parse arguments
     args = parser.parse_args()
@@ -202,19 +586,19 @@ def main():
     # Load environment variables from the file
     load_dotenv(args.env)
 
-    initialize_dynamodb()
+    initialize_dynamodb(max_pool_connections=max(10, args.workers, args.scan_segments))
 
     # Get unique session IDs from VideoLogs based on the specified date
-    unique_session_ids = get_unique_session_ids_for_date(args.date)
+    unique_session_ids = get_unique_session_ids_for_date(args.date, args.scan_segments)
 
     if not unique_session_ids:
         logger.warning(f"No session IDs found for the specified date: {args.date}")
         return
 
-    # Process each session ID and export user journey
-    # Export the user journey to CSV for each unique sessionId
-    for session_id in unique_session_ids:
-        export_user_journey_to_csv(session_id)
+    # Export the user journey to CSV for each unique sessionId, `--workers` at a time
+    checkpoint = ExportCheckpoint(args.checkpoint, args.lag_seconds) if args.incremental else None
+    summary = export_sessions(unique_session_ids, args.workers, args.consistent, args.limit, checkpoint)
+    log_export_summary(summary)
 
 
 if __name__ == "__main__":
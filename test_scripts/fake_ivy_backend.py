@@ -0,0 +1,93 @@
+############################################################################
+# For local development only!
+# Purpose: Stand-in for the MCM/MAGE `/ivy/ask_question` endpoint, for load
+#          testing without the real backends. Latency, answer size and
+#          failures are drawn from configurable distributions.
+# Usage: python test_scripts/fake_ivy_backend.py --port 8100 --latency-ms 800
+#        Every skill is served under /<skill-slug>/ivy/ask_question as well as
+#        /ivy/ask_question (see local_app.py).
+############################################################################
+import argparse
+import asyncio
+import json
+import random
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+WORDS = (
+    "agent knowledge frame semantic network production rule goal state operator "
+    "means end analysis planning classification concept learning logic resolution"
+).split()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Fake MCM/MAGE backend for load tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency-ms", type=float, default=800, help="Median time to a complete answer")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="Log-normal spread of the latency")
+    parser.add_argument("--words", type=int, default=150, help="Median answer length in words")
+    parser.add_argument("--words-sigma", type=float, default=0.4, help="Log-normal spread of the answer length")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 500")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="Fraction of requests that never answer in time")
+    parser.add_argument("--hang-secs", type=float, default=120, help="How long a hanging request waits")
+    parser.add_argument("--stream", action="store_true", help="Answer with SSE when the client accepts it")
+    return parser.parse_args(argv)
+
+
+def create_app(config):
+    def draw_answer():
+        words = max(1, int(random.lognormvariate(0, config.words_sigma) * config.words))
+        return " ".join(random.choice(WORDS) for _ in range(words))
+
+    def draw_latency():
+        return random.lognormvariate(0, config.latency_sigma) * config.latency_ms / 1000
+
+    async def ask_question(request: Request):
+        payload = await request.json()
+        roll = random.random()
+        if roll < config.hang_rate:
+            await asyncio.sleep(config.hang_secs)
+        elif roll < config.hang_rate + config.error_rate:
+            await asyncio.sleep(draw_latency() / 4)
+            return JSONResponse({"error": "fake backend failure"}, status_code=500)
+
+        answer = draw_answer()
+        latency = draw_latency()
+        response_json = {
+            "response": answer,
+            "question": payload.get("question", ""),
+            "skill": request.path_params.get("skill", payload.get("skill", "")),
+        }
+        if not (config.stream and "text/event-stream" in request.headers.get("accept", "")):
+            await asyncio.sleep(latency)
+            return JSONResponse(response_json)
+
+        async def events():
+            # First token after a quarter of the latency, the rest spread over the remainder
+            tokens = answer.split(" ")
+            await asyncio.sleep(latency / 4)
+            for index, token in enumerate(tokens):
+                delta = token if index == 0 else f" {token}"
+                yield f"data: {json.dumps({'delta': delta})}\n\n"
+                await asyncio.sleep(latency * 3 / 4 / len(tokens))
+            yield f"data: {json.dumps(response_json)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return Starlette(
+        routes=[
+            Route("/ivy/ask_question", ask_question, methods=["POST"]),
+            Route("/{skill}/ivy/ask_question", ask_question, methods=["POST"]),
+        ]
+    )
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    uvicorn.run(create_app(args), host=args.host, port=args.port, log_level="warning")
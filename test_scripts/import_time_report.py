@@ -0,0 +1,165 @@
+############################################################################
+# For local development only!
+# Purpose: Import-time budget report. Runs `python -X importtime -c "import main"`
+#          in a fresh interpreter and breaks the time down by top-level package
+#          and by the modules main.py imports directly, then (optionally) times
+#          main.create_app(), which builds the Gradio pages. Exits with status 1
+#          when a budget is exceeded, so it can guard cold-start regressions.
+# Usage: python test_scripts/import_time_report.py
+#        python test_scripts/import_time_report.py --budget-ms 6000 \
+#            --package-budget gradio=4000 --package-budget boto3=100 --build-app
+############################################################################
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORT_TIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+BUILD_APP_SNIPPET = """
+import json, time
+started = time.perf_counter()
+import {module}
+imported = time.perf_counter()
+{module}.create_app()
+print(json.dumps({{"import_ms": (imported - started) * 1000, "create_app_ms": (time.perf_counter() - imported) * 1000}}))
+"""
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Break down the import time of the Ivy app")
+    parser.add_argument("--module", default="main", help="Module to import")
+    parser.add_argument("--top", type=int, default=15, help="Rows per table")
+    parser.add_argument("--budget-ms", type=float, help="Fail when the total import time exceeds this")
+    parser.add_argument(
+        "--package-budget",
+        action="append",
+        default=[],
+        metavar="PACKAGE=MS",
+        help="Fail when a top-level package's summed self time exceeds MS (repeatable)",
+    )
+    parser.add_argument("--build-app", action="store_true", help="Also time create_app() after the import")
+    parser.add_argument("--json", help="Also write the report to this JSON file")
+    return parser.parse_args(argv)
+
+
+def app_environment():
+    env = dict(os.environ)
+    # constants.py refuses to import without these; nothing is contacted during import
+    env.setdefault("COGNITO_LOCALHOST_CLIENT_SECRET", "local")
+    env.setdefault("COGNITO_PROD_CLIENT_SECRET", "local")
+    env.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    return env
+
+
+def run_importtime(module):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT_DIR,
+        env=app_environment(),
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    return parse_importtime(result.stderr)
+
+
+def parse_importtime(output):
+    """Returns (name, self_us, cumulative_us, depth) per imported module, in import order."""
+    entries = []
+    for line in output.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            entries.append((name, int(self_us), int(cumulative_us), len(indent) // 2))
+    return entries
+
+
+def build_report(module, entries, build_times=None):
+    # -X importtime prints children before their parent, so a module's direct imports are the
+    # deeper entries printed since the previous entry at its own depth
+    direct_imports, pending = [], []
+    for name, self_us, cumulative_us, depth in entries:
+        if name == module:
+            direct_imports = [entry for entry in pending if entry[3] == depth + 1]
+            pending = []
+        else:
+            pending.append((name, self_us, cumulative_us, depth))
+
+    by_package = defaultdict(int)
+    for name, self_us, _, _ in entries:
+        by_package[name.split(".")[0]] += self_us
+
+    report = {
+        "module": module,
+        "total_ms": sum(self_us for _, self_us, _, _ in entries) / 1000,
+        "modules_imported": len(entries),
+        "direct_imports_ms": {
+            name: cumulative_us / 1000
+            for name, _, cumulative_us, _ in sorted(direct_imports, key=lambda entry: -entry[2])
+        },
+        "packages_ms": {
+            name: self_us / 1000 for name, self_us in sorted(by_package.items(), key=lambda item: -item[1])
+        },
+    }
+    if build_times:
+        report.update(build_times)
+    return report
+
+
+def time_create_app(module):
+    result = subprocess.run(
+        [sys.executable, "-c", BUILD_APP_SNIPPET.format(module=module)],
+        cwd=ROOT_DIR,
+        env=app_environment(),
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"{module}.create_app() failed:\n{result.stderr[-2000:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def check_budgets(report, budget_ms, package_budgets):
+    failures = []
+    if budget_ms is not None and report["total_ms"] > budget_ms:
+        failures.append(f"total import time {report['total_ms']:.0f} ms > budget {budget_ms:.0f} ms")
+    for spec in package_budgets:
+        package, _, limit = spec.partition("=")
+        spent = report["packages_ms"].get(package, 0.0)
+        if spent > float(limit):
+            failures.append(f"{package} {spent:.0f} ms > budget {float(limit):.0f} ms")
+    return failures
+
+
+def print_report(report, top):
+    print(f"import {report['module']}: {report['total_ms']:.0f} ms across {report['modules_imported']} modules")
+    if "create_app_ms" in report:
+        print(f"{report['module']}.create_app(): {report['create_app_ms']:.0f} ms")
+    for title, key in (
+        (f"Direct imports of {report['module']} (cumulative)", "direct_imports_ms"),
+        ("Top-level packages (self time, summed)", "packages_ms"),
+    ):
+        print(f"\n{title}")
+        for name, ms in list(report[key].items())[:top]:
+            share = 100 * ms / report["total_ms"] if report["total_ms"] else 0
+            print(f"  {name:<40} {ms:>9.1f} ms  {share:5.1f}%")
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    build_times = time_create_app(args.module) if args.build_app else None
+    report = build_report(args.module, run_importtime(args.module), build_times)
+    print_report(report, args.top)
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(report, file, indent=2)
+    failures = check_budgets(report, args.budget_ms, args.package_budget)
+    for failure in failures:
+        print(f"Over budget: {failure}")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,276 @@
+############################################################################
+# For local development only!
+# Purpose: Load test the embed page. Simulates N concurrent embed sessions
+#          against /ask-ivy-embed through Gradio's queue API (page load, then
+#          several chat turns each) and reports turn latency percentiles and
+#          throughput.
+# Usage (fully offline, starts fake_ivy_backend.py and local_app.py itself):
+#   python test_scripts/load_test.py --spawn --sessions 50 --turns 5 \
+#       --backend-args "--latency-ms 800 --error-rate 0.01 --stream"
+# Usage (against an already running app):
+#   python test_scripts/load_test.py --url http://127.0.0.1:8002 --sessions 50
+############################################################################
+import argparse
+import asyncio
+import json
+import os
+import random
+import shlex
+import subprocess
+import sys
+import time
+import uuid
+
+import httpx
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+QUESTIONS = [
+    "What is a semantic network?",
+    "How does means-end analysis choose an operator?",
+    "Can you explain incremental concept learning?",
+    "What is the difference between planning and problem solving?",
+    "How does resolution theorem proving work?",
+]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the Ivy embed page")
+    parser.add_argument("--url", default="http://127.0.0.1:8002", help="Base URL of the Ivy app")
+    parser.add_argument("--sessions", type=int, default=20, help="Concurrent embed sessions")
+    parser.add_argument("--turns", type=int, default=3, help="Chat turns per session")
+    parser.add_argument("--skill", default="Logic")
+    parser.add_argument("--backend", default="MCM", choices=["MCM", "MAGE"])
+    parser.add_argument("--think-ms", type=float, default=1000, help="Mean pause between a session's turns")
+    parser.add_argument("--ramp-secs", type=float, default=5, help="Spread session starts over this many seconds")
+    parser.add_argument(
+        "--repeat-questions",
+        action="store_true",
+        help="Ask only the fixed question pool, so the response cache and request coalescing kick in",
+    )
+    parser.add_argument("--timeout", type=float, default=120, help="Per-turn timeout in seconds")
+    parser.add_argument("--json", help="Also write the report to this JSON file")
+    parser.add_argument("--spawn", action="store_true", help="Start fake_ivy_backend.py and local_app.py first")
+    parser.add_argument("--backend-port", type=int, default=8100)
+    parser.add_argument("--backend-args", default="", help="Extra arguments for fake_ivy_backend.py")
+    return parser.parse_args(argv)
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class EmbedPage:
+    """Minimal client for the embed page's Gradio queue API (sse_v3 protocol)."""
+
+    def __init__(self, client, base_url):
+        self.client = client
+        self.page_url = f"{base_url.rstrip('/')}/ask-ivy-embed"
+        self.api_url = None
+        self.fn_index = {}
+        self.trigger_id = {}
+
+    async def discover(self):
+        config = (await self.client.get(f"{self.page_url}/config")).json()
+        self.api_url = f"{self.page_url}{config.get('api_prefix', '/gradio_api')}"
+        for dependency in config["dependencies"]:
+            api_name = dependency.get("api_name")
+            if api_name in ("on_page_load_ask_ivy_embed", "update_user_message", "get_response_from_ivy"):
+                self.fn_index[api_name] = dependency["id"]
+                self.trigger_id[api_name] = dependency["targets"][0][0] if dependency["targets"] else None
+
+    async def run(self, api_name, data, session_hash, params=None):
+        # Events with queue=False are answered directly
+        response = await self.client.post(
+            f"{self.api_url}/run/predict",
+            params=params,
+            json=self._body(api_name, data, session_hash),
+        )
+        response.raise_for_status()
+        return response.json()["data"]
+
+    async def run_queued(self, api_name, data, session_hash, params=None):
+        """Returns (seconds to first streamed output or None, completed message)."""
+        started = time.perf_counter()
+        response = await self.client.post(
+            f"{self.api_url}/queue/join",
+            params=params,
+            json=self._body(api_name, data, session_hash),
+        )
+        response.raise_for_status()
+        event_id = response.json()["event_id"]
+        first_output = None
+        async with self.client.stream(
+            "GET", f"{self.api_url}/queue/data", params={"session_hash": session_hash}
+        ) as stream:
+            async for line in stream.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                message = json.loads(line[5:])
+                if message.get("event_id") not in (None, event_id):
+                    continue
+                if message.get("msg") == "process_generating" and first_output is None:
+                    first_output = time.perf_counter() - started
+                if message.get("msg") == "process_completed":
+                    return first_output, message
+        raise RuntimeError(f"Queue stream ended before {api_name} completed")
+
+    def _body(self, api_name, data, session_hash):
+        return {
+            "data": data,
+            "fn_index": self.fn_index[api_name],
+            "trigger_id": self.trigger_id[api_name],
+            "session_hash": session_hash,
+            "event_data": None,
+        }
+
+
+async def run_session(page, args, session_number, results):
+    await asyncio.sleep(random.uniform(0, args.ramp_secs))
+    session_hash = uuid.uuid4().hex[:11]
+    params = {
+        "backend": args.backend,
+        "skill": args.skill,
+        "user_id": f"load-user-{session_number}",
+        "session_id": f"load-session-{session_number}",
+        "course_id": f"load-course-{session_number % 4}",
+    }
+    try:
+        _, loaded = await page.run_queued("on_page_load_ask_ivy_embed", [], session_hash, params)
+        if not loaded.get("success", False):
+            raise RuntimeError("page load failed")
+    except Exception as e:
+        results["errors"].append(f"page load: {type(e).__name__}: {e}")
+        return
+
+    history = []
+    for turn in range(args.turns):
+        question = random.choice(QUESTIONS)
+        if not args.repeat_questions:
+            question = f"{question} (session {session_number}, turn {turn})"
+        started = time.perf_counter()
+        try:
+            _, history = await page.run("update_user_message", [question, history, None], session_hash)
+            first_output, completed = await asyncio.wait_for(
+                page.run_queued("get_response_from_ivy", [history, None, None], session_hash),
+                args.timeout,
+            )
+            if not completed.get("success", False):
+                raise RuntimeError(completed.get("output", {}).get("error") or "turn failed")
+            history = completed["output"]["data"][0] or history
+            answer = history[-1][1] or ""
+            results["turn_latencies"].append(time.perf_counter() - started)
+            if first_output is not None:
+                results["first_output_latencies"].append(first_output)
+            results["answer_bytes"] += len(answer.encode())
+            if not answer.strip():
+                results["empty_answers"] += 1
+        except Exception as e:
+            results["errors"].append(f"turn: {type(e).__name__}: {e}")
+        await asyncio.sleep(random.expovariate(1000 / args.think_ms) if args.think_ms > 0 else 0)
+
+
+async def run_load_test(args):
+    results = {"turn_latencies": [], "first_output_latencies": [], "errors": [], "answer_bytes": 0, "empty_answers": 0}
+    limits = httpx.Limits(max_connections=args.sessions * 2 + 10)
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        page = EmbedPage(client, args.url)
+        await page.discover()
+        started = time.perf_counter()
+        await asyncio.gather(*(run_session(page, args, number, results) for number in range(args.sessions)))
+        elapsed = time.perf_counter() - started
+    return build_report(args, results, elapsed)
+
+
+def build_report(args, results, elapsed):
+    turn_latencies = results["turn_latencies"]
+    first_output_latencies = results["first_output_latencies"]
+    return {
+        "sessions": args.sessions,
+        "turns_per_session": args.turns,
+        "completed_turns": len(turn_latencies),
+        "failed": len(results["errors"]),
+        "empty_answers": results["empty_answers"],
+        "elapsed_secs": round(elapsed, 3),
+        "throughput_turns_per_sec": round(len(turn_latencies) / elapsed, 3) if elapsed else 0,
+        "answer_bytes": results["answer_bytes"],
+        "turn_latency_secs": {
+            name: percentile(turn_latencies, q) for name, q in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99))
+        },
+        "first_output_secs": {
+            name: percentile(first_output_latencies, q) for name, q in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99))
+        },
+        "sample_errors": results["errors"][:10],
+    }
+
+
+def print_report(report):
+    print(f"Sessions: {report['sessions']} x {report['turns_per_session']} turns")
+    print(
+        f"Completed turns: {report['completed_turns']}  failed: {report['failed']}  "
+        f"empty answers: {report['empty_answers']}"
+    )
+    print(f"Elapsed: {report['elapsed_secs']:.1f}s  throughput: {report['throughput_turns_per_sec']:.2f} turns/s")
+    for title, key in (("Turn latency", "turn_latency_secs"), ("First output", "first_output_secs")):
+        values = "  ".join(
+            f"{name}={value:.3f}s" if value is not None else f"{name}=n/a" for name, value in report[key].items()
+        )
+        print(f"{title}: {values}")
+    for error in report["sample_errors"]:
+        print(f"  error: {error}")
+
+
+####################################################################################
+# Local Stand-ins
+####################################################################################
+
+
+def spawn_stand_ins(args):
+    backend_url = f"http://127.0.0.1:{args.backend_port}"
+    port = args.url.rsplit(":", 1)[-1].strip("/")
+    processes = [
+        subprocess.Popen(
+            [sys.executable, os.path.join(SCRIPTS_DIR, "fake_ivy_backend.py"), "--port", str(args.backend_port)]
+            + shlex.split(args.backend_args)
+        ),
+        subprocess.Popen(
+            [sys.executable, os.path.join(SCRIPTS_DIR, "local_app.py"), "--port", port, "--backend-url", backend_url]
+        ),
+    ]
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{args.url}/readyz", timeout=2).status_code == 200:
+                return processes
+        except httpx.HTTPError:
+            pass
+        if any(process.poll() is not None for process in processes):
+            break
+        time.sleep(1)
+    stop_stand_ins(processes)
+    raise RuntimeError("Local app did not become ready")
+
+
+def stop_stand_ins(processes):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    processes = spawn_stand_ins(args) if args.spawn else []
+    try:
+        report = asyncio.run(run_load_test(args))
+    finally:
+        stop_stand_ins(processes)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(report, file, indent=2)
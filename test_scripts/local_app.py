@@ -0,0 +1,119 @@
+############################################################################
+# For local development only!
+# Purpose: Run the Ivy app fully offline for load tests. DynamoDB is replaced
+#          by moto (in memory) with the five tables used in chat_logging.py,
+#          and every MCM skill and MAGE point at fake_ivy_backend.py.
+# Requires: pip install "moto[dynamodb]"
+# Usage: python test_scripts/local_app.py --backend-url http://127.0.0.1:8100 --port 8002
+############################################################################
+import argparse
+import os
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+EVAL_QUESTIONS_PER_SKILL = 5
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the Ivy app against local stand-ins")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8002)
+    parser.add_argument("--backend-url", default="http://127.0.0.1:8100", help="fake_ivy_backend.py base URL")
+    return parser.parse_args(argv)
+
+
+def start_fake_dynamodb():
+    try:
+        from moto import mock_aws as mock_dynamodb
+    except ImportError:  # moto < 5
+        from moto import mock_dynamodb
+    mock = mock_dynamodb()
+    mock.start()
+    return mock
+
+
+def create_tables(dynamodb, skill_names):
+    def create_table(name, keys, indexes=()):
+        attributes = {attribute for attribute, _ in keys}
+        attributes |= {attribute for _, index_keys in indexes for attribute, _ in index_keys}
+        table_kwargs = {
+            "TableName": name,
+            "KeySchema": [{"AttributeName": a, "KeyType": t} for a, t in keys],
+            "AttributeDefinitions": [{"AttributeName": a, "AttributeType": "S"} for a in sorted(attributes)],
+            "BillingMode": "PAY_PER_REQUEST",
+        }
+        if indexes:
+            table_kwargs["GlobalSecondaryIndexes"] = [
+                {
+                    "IndexName": index_name,
+                    "KeySchema": [{"AttributeName": a, "KeyType": t} for a, t in index_keys],
+                    "Projection": {"ProjectionType": "ALL"},
+                }
+                for index_name, index_keys in indexes
+            ]
+        return dynamodb.create_table(**table_kwargs)
+
+    from constants import CHAT_HISTORY_FLAGGED_INDEX, CHAT_HISTORY_SESSION_INDEX
+
+    chat_history_indexes = [(CHAT_HISTORY_SESSION_INDEX, [("SessionId", "HASH"), ("Timestamp", "RANGE")])]
+    if CHAT_HISTORY_FLAGGED_INDEX:
+        chat_history_indexes.append((CHAT_HISTORY_FLAGGED_INDEX, [("FlaggedSessionId", "HASH"), ("Timestamp", "RANGE")]))
+    create_table("ChatHistory", [("Username", "HASH"), ("Timestamp", "RANGE")], chat_history_indexes)
+    create_table("UserLogin", [("Username", "HASH"), ("Timestamp", "RANGE")])
+    create_table("Evaluation", [("Username", "HASH"), ("Timestamp", "RANGE")])
+    create_table("TestEvaluation", [("Username", "HASH"), ("Timestamp", "RANGE")])
+    eval_questions = create_table("EvalQuestions", [("Question", "HASH")])
+    with eval_questions.batch_writer() as writer:
+        for skill_name in skill_names:
+            for index in range(EVAL_QUESTIONS_PER_SKILL):
+                writer.put_item(
+                    Item={
+                        "Question": f"{skill_name} question {index}?",
+                        "QuestionType": "Conceptual",
+                        "Skill": skill_name,
+                    }
+                )
+
+
+def point_backends_at(backend_url):
+    # Must run before main/backend_client import these names from constants
+    import constants
+
+    base_url = backend_url.rstrip("/")
+    for skill_name in constants.SKILL_NAME_TO_MCM_URL:
+        slug = skill_name.lower().replace(" ", "-")
+        constants.SKILL_NAME_TO_MCM_URL[skill_name] = f"{base_url}/{slug}/ivy/ask_question"
+    constants.MAGE_URL = f"{base_url}/mage/ivy/ask_question"
+
+
+def create_local_app(backend_url):
+    os.environ.setdefault("COGNITO_LOCALHOST_CLIENT_SECRET", "local")
+    os.environ.setdefault("COGNITO_PROD_CLIENT_SECRET", "local")
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    # The fake backend does not need warming; the load is what is being measured
+    os.environ.setdefault("IVY_PROBE_INTERVAL", "0")
+    sys.path.insert(0, ROOT_DIR)
+
+    import boto3
+
+    start_fake_dynamodb()
+    point_backends_at(backend_url)
+    import constants
+
+    create_tables(boto3.resource("dynamodb", region_name="us-east-1"), constants.SKILL_NAME_TO_MCM_URL)
+
+    import main
+
+    return main.app
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    app = create_local_app(args.backend_url)
+
+    import uvicorn
+
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
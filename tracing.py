@@ -0,0 +1,251 @@
+#####################################################################################################################
+# Description:
+# The tracing.py module records trace spans for a chat session: the page load starts a trace whose context is kept
+# in the session state, and every later event (user message, backend request, streaming loop, DynamoDB calls)
+# becomes a child span, so a slow turn can be broken down without a live tracing service.
+# Spans are exported in batches by a background thread as OTLP/JSON, either appended to a local file
+# (IVY_TRACE_FILE, one export request per line) or posted to an OTLP/HTTP collector (IVY_OTLP_ENDPOINT).
+# Backend requests carry the trace as a correlation ID header and a W3C traceparent header.
+#   Usage: (1) Import: from tracing import span, traced, current_trace_context, propagation_headers
+#          (2) Call by: with span("stream_response"): ...
+#                       @traced("log_chat_history")
+#####################################################################################################################
+import asyncio
+import atexit
+import contextvars
+import functools
+import inspect
+import json
+import os
+import queue
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+
+import httpx
+
+from constants import (
+    CORRELATION_ID_HEADER,
+    OTLP_ENDPOINT,
+    TRACE_EXPORT_INTERVAL_SECS,
+    TRACE_FILE,
+    TRACE_QUEUE_SIZE,
+    TRACE_SERVICE_NAME,
+)
+
+_current_span = contextvars.ContextVar("ivy_current_span", default=None)
+
+
+class Span:
+    def __init__(self, name, trace_id, parent_id="", attributes=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.attributes = dict(attributes or {})
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.error = ""
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def context(self):
+        # What is kept in session state so later events join this trace
+        return {"trace_id": self.trace_id, "span_id": self.span_id}
+
+    def end(self):
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            span_exporter.export(self)
+
+    def to_otlp(self):
+        otlp_span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [_otlp_attribute(key, value) for key, value in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 0},
+        }
+        if self.parent_id:
+            otlp_span["parentSpanId"] = self.parent_id
+        return otlp_span
+
+
+def _otlp_attribute(key, value):
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+@contextmanager
+def span(name, parent=None, **attributes):
+    """Starts a span under `parent` (a context() dict from session state), else under the current span, else
+    as the root of a new trace."""
+    current = _current_span.get()
+    if parent:
+        trace_id, parent_id = parent["trace_id"], parent["span_id"]
+    elif current is not None:
+        trace_id, parent_id = current.trace_id, current.span_id
+    else:
+        trace_id, parent_id = secrets.token_hex(16), ""
+    new_span = Span(name, trace_id, parent_id, attributes)
+    # Restored with set() rather than a reset token: async generator handlers may resume in another context
+    _current_span.set(new_span)
+    try:
+        yield new_span
+    except (GeneratorExit, asyncio.CancelledError, KeyboardInterrupt):
+        new_span.set_attribute("cancelled", True)
+        raise
+    except BaseException as e:
+        new_span.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current_span.set(current)
+        new_span.end()
+
+
+@contextmanager
+def child_span(name, **attributes):
+    # Only traces work that is already part of a trace (e.g. skips the write-behind worker thread)
+    if _current_span.get() is None:
+        yield None
+        return
+    with span(name, **attributes) as new_span:
+        yield new_span
+
+
+def traced(name, parent=None, new_trace=False):
+    """Decorator for sync, async and async generator functions. By default the call is traced only as a child of
+    the current span; `parent` maps the call's arguments to a stored trace context instead, e.g.
+    lambda history, settings, lti_data: lti_data.value.get("trace"), and `new_trace` always starts a trace."""
+
+    def decorator(fn):
+        def open_span(args, kwargs):
+            if new_trace:
+                return span(name)
+            if parent:
+                return span(name, parent(*args, **kwargs))
+            return child_span(name)
+
+        if inspect.isasyncgenfunction(fn):
+
+            @functools.wraps(fn)
+            async def async_gen_wrapper(*args, **kwargs):
+                with open_span(args, kwargs):
+                    async for item in fn(*args, **kwargs):
+                        yield item
+
+            return async_gen_wrapper
+
+        if inspect.iscoroutinefunction(fn):
+
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with open_span(args, kwargs):
+                    return await fn(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with open_span(args, kwargs):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def current_trace_context():
+    current = _current_span.get()
+    return current.context() if current is not None else None
+
+
+def propagation_headers():
+    current = _current_span.get()
+    if current is None:
+        return {}
+    return {
+        CORRELATION_ID_HEADER: current.trace_id,
+        "traceparent": f"00-{current.trace_id}-{current.span_id}-01",
+    }
+
+
+####################################################################################
+# Exporting Spans
+####################################################################################
+
+
+class SpanExporter:
+    def __init__(self, trace_file=TRACE_FILE, otlp_endpoint=OTLP_ENDPOINT):
+        self.trace_file = trace_file
+        self.otlp_endpoint = otlp_endpoint.rstrip("/")
+        self.enabled = bool(trace_file or otlp_endpoint)
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=TRACE_QUEUE_SIZE)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+    def export(self, finished_span):
+        if not self.enabled:
+            return
+        self._start()
+        try:
+            self._queue.put_nowait(finished_span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            time.sleep(TRACE_EXPORT_INTERVAL_SECS)
+            self.flush()
+
+    def flush(self):
+        with self._flush_lock:
+            spans = []
+            while True:
+                try:
+                    spans.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if spans:
+                self._write(spans)
+
+    def _write(self, spans):
+        request = {
+            "resourceSpans": [
+                {
+                    "resource": {"attributes": [_otlp_attribute("service.name", TRACE_SERVICE_NAME)]},
+                    "scopeSpans": [{"scope": {"name": "ivy"}, "spans": [s.to_otlp() for s in spans]}],
+                }
+            ]
+        }
+        try:
+            if self.trace_file:
+                os.makedirs(os.path.dirname(os.path.abspath(self.trace_file)), exist_ok=True)
+                with open(self.trace_file, "a") as file:
+                    file.write(json.dumps(request) + "\n")
+            if self.otlp_endpoint:
+                httpx.post(f"{self.otlp_endpoint}/v1/traces", json=request, timeout=5)
+        except Exception as e:
+            print(f"Error exporting {len(spans)} spans: {e}")
+
+
+span_exporter = SpanExporter()
@@ -1,19 +1,35 @@
 #####################################################################################################################
 # Description:
-# The user_data.py module defines the user data and configuration settings.
-# Class UserConfig is used so that other modules are able to
+# The user_data.py module defines the user data kept for each session.
+# Class UserConfig holds one signed-in user; instances live in the per-session state and the session store,
+# so concurrent users (and several worker processes) never share it.
 #   Usage: (1) Import: from user_data import UserConfig
-#          (2) Call by: UserConfig.ACCESS_TOKEN, UserConfig.USERNAME
+#          (2) Call by: user = UserConfig.from_dict(session), user.USERNAME, user.ACCESS_TOKEN
 #####################################################################################################################
 
 
 class UserConfig:
-    USERNAME = "-"
-    USER_NAME = "-"
-    ACCESS_TOKEN = "-"
+    def __init__(self, username="-", user_name="-", access_token="-"):
+        self.USERNAME = username
+        self.USER_NAME = user_name
+        self.ACCESS_TOKEN = access_token
+
+    def set_user_info(self, username, user_name, access_token):
+        self.USERNAME = username
+        self.USER_NAME = user_name
+        self.ACCESS_TOKEN = access_token
+
+    def to_dict(self):
+        return {
+            "username": self.USERNAME,
+            "user_name": self.USER_NAME,
+            "access_token": self.ACCESS_TOKEN,
+        }
 
     @classmethod
-    def set_user_info(cls, username, user_name, access_token):
-        cls.USERNAME = username
-        cls.USER_NAME = user_name
-        cls.ACCESS_TOKEN = access_token
+    def from_dict(cls, data):
+        return cls(
+            data.get("username", "-"),
+            data.get("user_name", "-"),
+            data.get("access_token", "-"),
+        )
@@ -0,0 +1,206 @@
+#####################################################################################################################
+# Description:
+# The write_behind.py module provides a background write-behind queue for DynamoDB puts.
+# Items are accepted without waiting for DynamoDB, buffered in a bounded queue and written by a worker thread with
+# BatchWriteItem once either the batch size or the flush interval is reached. Throttled or unprocessed items are
+# retried with exponential backoff, and the queue is drained when the process shuts down.
+#   Usage: (1) Import: from write_behind import WriteBehindQueue
+#          (2) Call by: writer = WriteBehindQueue(client, "ChatHistory", ("Username", "Timestamp"))
+#                       writer.submit(item)  # False when the queue is full or closed
+#####################################################################################################################
+import atexit
+import queue
+import random
+import threading
+import time
+
+from boto3.dynamodb.types import TypeSerializer
+from botocore.exceptions import ClientError
+
+from metrics import time_dynamodb_call
+
+# DynamoDB limit for a single BatchWriteItem request
+MAX_BATCH_SIZE = 25
+THROTTLING_ERROR_CODES = (
+    "ProvisionedThroughputExceededException",
+    "ThrottlingException",
+    "RequestLimitExceeded",
+)
+
+_STOP = object()
+
+
+class _FlushRequest:
+    def __init__(self):
+        self.done = threading.Event()
+
+
+class WriteBehindQueue:
+    def __init__(
+        self,
+        client,
+        table_name,
+        key_fields,
+        max_queue_size=1000,
+        batch_size=MAX_BATCH_SIZE,
+        flush_interval=1.0,
+        max_retries=5,
+        base_backoff=0.1,
+    ):
+        # `client` is a plain low-level DynamoDB client, which (unlike resources) is safe to share across
+        # threads. Items are serialized here, so do not pass a resource's meta.client (it serializes again).
+        # It may also be a zero-argument callable, so the client is only created once something is written.
+        self._client = client
+        self.table_name = table_name
+        self.key_fields = tuple(key_fields)
+        self.batch_size = min(batch_size, MAX_BATCH_SIZE)
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._serializer = TypeSerializer()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def start(self):
+        with self._lock:
+            if self._thread is None and not self._closed:
+                self._thread = threading.Thread(
+                    target=self._run, name=f"write-behind-{self.table_name}", daemon=True
+                )
+                self._thread.start()
+                atexit.register(self.close)
+
+    def submit(self, item):
+        # Items DynamoDB would reject for their key are left to the caller's synchronous write, so
+        # they cannot fail a whole batch of other items
+        if self._closed or not self.has_valid_key(item):
+            return False
+        self.start()
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            return False
+        return True
+
+    def has_valid_key(self, item):
+        return all(item.get(field) not in (None, "") for field in self.key_fields)
+
+    @property
+    def client(self):
+        if callable(self._client):
+            self._client = self._client()
+        return self._client
+
+    def depth(self):
+        return self._queue.qsize()
+
+    def flush(self, timeout=None):
+        # Blocks until everything submitted before this call has been written
+        if self._thread is None or self._closed:
+            return
+        request = _FlushRequest()
+        self._queue.put(request)
+        request.done.wait(timeout)
+
+    def close(self, timeout=10):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+
+    ####################################################################################
+    # Worker Thread
+    ####################################################################################
+
+    def _run(self):
+        stop = False
+        while not stop:
+            batch, flush_requests = [], []
+            item = self._queue.get()
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is _STOP:
+                    stop = True
+                    break
+                if isinstance(item, _FlushRequest):
+                    flush_requests.append(item)
+                    break
+                batch.append(item)
+                remaining = deadline - time.monotonic()
+                if len(batch) >= self.batch_size or remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+
+            if stop:
+                # Drain whatever is still queued before exiting
+                while True:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if isinstance(item, _FlushRequest):
+                        flush_requests.append(item)
+                    elif item is not _STOP:
+                        batch.append(item)
+
+            for start in range(0, len(batch), self.batch_size):
+                self._write_batch(batch[start : start + self.batch_size])
+            for request in flush_requests:
+                request.done.set()
+
+    def _write_batch(self, items):
+        # A batch may not contain two writes for the same key; the latest item wins
+        latest_by_key = {}
+        for item in items:
+            latest_by_key[tuple(item[field] for field in self.key_fields)] = item
+        put_requests = []
+        for item in latest_by_key.values():
+            try:
+                serialized = {
+                    name: self._serializer.serialize(value) for name, value in item.items()
+                }
+            except Exception as e:
+                # e.g. a float or another type DynamoDB can't store; only this item is lost, and the
+                # worker thread keeps running
+                print(f"Error serializing {self.table_name} item, dropping it: {e}")
+                continue
+            put_requests.append({"PutRequest": {"Item": serialized}})
+        if put_requests:
+            self._send(put_requests)
+
+    def _send(self, put_requests):
+        request_items = {self.table_name: put_requests}
+        for attempt in range(self.max_retries + 1):
+            try:
+                with time_dynamodb_call(f"write_behind:{self.table_name}"):
+                    response = self.client.batch_write_item(RequestItems=request_items)
+                request_items = response.get("UnprocessedItems") or {}
+            except ClientError as e:
+                error_code = e.response["Error"]["Code"]
+                if error_code == "ValidationException" and len(put_requests) > 1:
+                    # DynamoDB rejects the whole batch for one invalid item; write them one by one
+                    # so only that item is lost
+                    for put_request in put_requests:
+                        self._send([put_request])
+                    return
+                if error_code not in THROTTLING_ERROR_CODES:
+                    print(f"Error writing {len(put_requests)} {self.table_name} items: {e}")
+                    return
+            except Exception as e:
+                print(f"Error writing {len(put_requests)} {self.table_name} items: {e}")
+                return
+            if not request_items:
+                return
+            # Exponential backoff with jitter before retrying throttled / unprocessed items
+            time.sleep(self.base_backoff * (2**attempt) * (0.5 + random.random()))
+
+        dropped = sum(len(requests) for requests in request_items.values())
+        print(f"Dropped {dropped} {self.table_name} items after {self.max_retries} retries")